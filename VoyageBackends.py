@@ -0,0 +1,170 @@
+import time
+import numpy as np
+from VoyageEstimator import MAX_TICKS, SKILL_PICK_BINS, SKILL_PICK_TABLE, HAZ_AM_PASS, HAZ_AM_FAIL, \
+    HAZ_SKILL_PER_TICK, TickHistogram, _roll_needed, _skill_bounds, _tick_schedule, voyage_estimator_redux, \
+    voyage_estimator_numpy
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BENCHMARK_STATS = [13000, 12000, 6000, 5000, 4000, 3500, 2700]
+BENCHMARK_SIMS = 5000
+BENCHMARK_REPEATS = 5
+
+# Every backend is an estimator function taking (ps, ss, o1, o2, o3, o4, startAm, *, numSims, seed) and returning a
+# tuple of the average, safe, safer estimated voyage durations in hours, simulated with the same hazard rules
+_backends = {}
+_benchmarked_backends = []
+_fastest_backend = None
+
+
+def register_backend(name, estimator, *, benchmark=True):
+    '''
+
+    :param name: name to select the backend by
+    :param estimator: estimator function following the backend protocol above
+    :param benchmark: False to leave the backend out of the benchmark, so it's only used when selected by name
+    '''
+    global _fastest_backend
+    _backends[name] = estimator
+    if benchmark and name not in _benchmarked_backends:
+        _benchmarked_backends.append(name)
+    _fastest_backend = None
+
+
+def available_backends():
+    '''
+
+    :return: list of the names of the registered backends
+    '''
+    return list(_backends.keys())
+
+
+def benchmark_backends(*, num_sims=BENCHMARK_SIMS, repeats=BENCHMARK_REPEATS, debug=False):
+    '''
+    Time the registered backends on a sample lineup.  Each backend is run once untimed first, so one-off costs such as
+    Numba compilation aren't counted, and then timed repeats times, keeping its best time so a single slow run doesn't
+    decide the pick.
+
+    :param num_sims: number of voyages for each backend to simulate
+    :param repeats: number of timed runs of each backend
+    :param debug: True to print the timings
+    :return: dict of the best seconds each backend took, by name
+    '''
+    timings = {}
+    for name in _benchmarked_backends:
+        estimator = _backends[name]
+        estimator(*BENCHMARK_STATS, numSims=num_sims, seed=0)
+        runTimes = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            estimator(*BENCHMARK_STATS, numSims=num_sims, seed=0)
+            runTimes.append(time.perf_counter() - start)
+        timings[name] = min(runTimes)
+        if debug:
+            print(f'{name}: {timings[name] * 1000:0.1f}ms for {num_sims} sims')
+    return timings
+
+
+def get_backend(name=None):
+    '''
+
+    :param name: name of the backend; None for the fastest backend on this machine, benchmarked on first use
+    :return: the backend's estimator function
+    '''
+    global _fastest_backend
+    if name is not None:
+        if name not in _backends:
+            raise ValueError(f'unknown voyage estimator backend {name!r}; available: {available_backends()}')
+        return _backends[name]
+
+    if _fastest_backend is None:
+        timings = benchmark_backends()
+        _fastest_backend = min(timings, key=timings.get)
+    return _backends[_fastest_backend]
+
+
+def voyage_estimate(ps, ss, o1, o2, o3, o4, startAm, *, backend=None, numSims=5000, seed=None):
+    '''
+    Estimate a voyage with the given backend.
+
+    :param backend: name of the backend; None for the fastest
+    :param numSims: number of voyages to simulate
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: tuple of average, safe, safer estimated voyage durations in hours
+    '''
+    return tuple(get_backend(backend)(ps, ss, o1, o2, o3, o4, startAm, numSims=numSims, seed=seed))
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _numba_out_ticks(rollTicks, amDrift, rollNeeded, skillPickTable, startAm, numSims, seed):
+        '''
+        Compiled kernel for voyage_estimator_numba: simulates one voyage at a time, rolling only the hazards in
+        rollTicks and walking the AM drift in between (see _tick_schedule and _simulate_out_ticks).
+
+        :return: array of the ticks at which the simulated voyages ran out of AM
+        '''
+        np.random.seed(seed)
+        outTicks = np.empty(numSims, dtype=np.int64)
+
+        # Until the first hazard that needs a roll, every voyage plays out the same way
+        firstRollTick = rollTicks[0] if rollTicks.size > 0 else MAX_TICKS + 1
+        for tick in range(firstRollTick):
+            if startAm + amDrift[tick] <= 0:
+                outTicks[:] = tick
+                return outTicks
+
+        for iSim in range(numSims):
+            outTick = -1
+            am = startAm
+            iRoll = 0
+            while outTick < 0 and iRoll < rollTicks.size:
+                skill = skillPickTable[int(np.random.random() * SKILL_PICK_BINS)]
+                if np.random.random() >= rollNeeded[iRoll, skill]:
+                    am += HAZ_AM_PASS
+                else:
+                    am -= HAZ_AM_FAIL
+                spanEnd = rollTicks[iRoll + 1] if iRoll + 1 < rollTicks.size else MAX_TICKS + 1
+                if am + amDrift[spanEnd - 1] <= 0:
+                    for tick in range(rollTicks[iRoll], spanEnd):
+                        if am + amDrift[tick] <= 0:
+                            outTick = tick
+                            break
+                iRoll += 1
+            # voyages that outlast MAX_TICKS are recorded as running out at MAX_TICKS, as in _simulate_out_ticks
+            outTicks[iSim] = outTick if outTick >= 0 else MAX_TICKS
+        return outTicks
+
+    def voyage_estimator_numba(ps, ss, o1, o2, o3, o4, startAm, *, numSims=5000, seed=None):
+        '''
+        Numba-compiled equivalent of voyage_estimator_numpy, for hosts where a compiled loop beats array operations.
+
+        :param numSims: number of voyages to simulate
+        :param seed: seed for the random number generator; None to seed from the OS
+        :return: tuple of average, safe, safer estimated voyage durations in hours
+        '''
+        skillMins, skillMaxs = _skill_bounds([ps, ss, o1, o2, o3, o4])
+        rollTicks, amDrift = _tick_schedule(skillMins, skillMaxs)
+        rollNeeded = _roll_needed((rollTicks * HAZ_SKILL_PER_TICK).astype(np.int64)[:, np.newaxis], skillMins,
+                                  skillMaxs)
+        kernelSeed = np.random.default_rng(seed).integers(2 ** 32)
+        results = TickHistogram()
+        results.add(_numba_out_ticks(rollTicks, amDrift, rollNeeded, SKILL_PICK_TABLE, startAm, numSims, kernelSeed))
+        return results.quantiles()
+
+
+# The pure-Python reference is far slower than the others, so it's only for parity testing
+register_backend('python', voyage_estimator_redux, benchmark=False)
+register_backend('numpy', voyage_estimator_numpy)
+if numba is not None:
+    register_backend('numba', voyage_estimator_numba)
+
+
+if __name__ == "__main__":
+    benchmark_backends(debug=True)
+    for backend in available_backends():
+        print(f'{backend}: {voyage_estimate(*BENCHMARK_STATS, backend=backend, seed=1)}')
+    print(f'fastest: {get_backend().__name__}')
@@ -0,0 +1,218 @@
+import atexit
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from GameData import SUBFOLDER_NAME
+from VoyageEstimator import voyage_estimator_batch
+from VoyageBackends import get_backend
+
+CACHE_FILENAME = 'STT voyage estimate cache.json'
+
+
+class VoyageCache:
+    '''
+    Memoizes voyage estimates.  Entries are keyed on the skill totals, starting AM, estimator and the estimator's
+    precision settings (e.g. numSims), and kept in two tiers: a size-bounded LRU in memory, and a larger size-bounded
+    file on disk so estimates survive between runs.
+
+    The four other skills are sorted before lookup, since each is picked with the same chance and their order doesn't
+    change the estimate.  With skill_step > 1 skills are also rounded to the nearest multiple of skill_step, and the
+    estimate is made for the rounded skills, so nearby lineups share an entry.
+    '''
+
+    def __init__(self, *, max_memory_entries=10000, max_disk_entries=100000, skill_step=1,
+                 filepath=Path.home().joinpath(SUBFOLDER_NAME, CACHE_FILENAME)):
+        '''
+
+        :param max_memory_entries: number of estimates to keep in memory
+        :param max_disk_entries: number of estimates to keep on disk
+        :param skill_step: skills are rounded to the nearest multiple of this
+        :param filepath: file for the on-disk tier; None to keep estimates in memory only
+        '''
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.skill_step = skill_step
+        self.filepath = filepath
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.__memory = OrderedDict()
+        self.__disk = None
+        self.__disk_dirty = False
+        if self.filepath is not None:
+            atexit.register(self.save)
+
+    def __str__(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return f'{lookups} lookups: {self.hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses; ' \
+               f'{len(self.__memory)} entries in memory' + \
+               (f', {len(self.__disk)} on disk' if self.__disk is not None else '')
+
+    def __quantize(self, skills):
+        '''
+
+        :param skills: list of primary, secondary, other 1-4 skill totals
+        :return: list of the skills as they're cached: rounded to skill_step, with the other skills in descending order
+        '''
+        skills = [int(round(skill / self.skill_step)) * self.skill_step for skill in skills]
+        return skills[:2] + sorted(skills[2:], reverse=True)
+
+    @staticmethod
+    def __key(skills, start_am, estimator_name, precision):
+        return '|'.join([estimator_name, json.dumps(precision, sort_keys=True)] + [str(s) for s in skills] +
+                        [str(start_am)])
+
+    def __load_disk(self):
+        if self.__disk is not None:
+            return
+        self.__disk = {}
+        if self.filepath is not None and Path(self.filepath).exists():
+            print('Reading voyage estimate cache from file...')
+            try:
+                with open(self.filepath) as f:
+                    self.__disk = json.load(f)
+            except (ValueError, OSError) as e:
+                # e.g. a file left half written by an older version; it's only a cache, so start over
+                print(f'Ignoring unreadable voyage estimate cache file {self.filepath}: {e}')
+                self.__disk = {}
+
+    def __get(self, key):
+        if key in self.__memory:
+            self.__memory.move_to_end(key)
+            self.hits += 1
+            # keep the disk entry's last use up to date too, so save doesn't drop the most used entries
+            if self.__disk is not None and key in self.__disk:
+                self.__disk[key][1] = time.time()
+                self.__disk_dirty = True
+            return self.__memory[key]
+
+        if self.filepath is not None:
+            self.__load_disk()
+            if key in self.__disk:
+                self.disk_hits += 1
+                self.__disk[key][1] = time.time()
+                self.__disk_dirty = True
+                self.__put_memory(key, tuple(self.__disk[key][0]))
+                return self.__memory[key]
+
+        self.misses += 1
+        return None
+
+    def __put_memory(self, key, value):
+        self.__memory[key] = value
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.max_memory_entries:
+            self.__memory.popitem(last=False)
+
+    def __put(self, key, value):
+        self.__put_memory(key, value)
+        if self.filepath is not None:
+            self.__load_disk()
+            self.__disk[key] = [list(value), time.time()]
+            self.__disk_dirty = True
+
+    def estimate(self, ps, ss, o1, o2, o3, o4, start_am, *, estimator=None, **precision):
+        '''
+        Look up a voyage estimate, running the estimator on a miss.
+
+        :param estimator: estimator function taking (ps, ss, o1, o2, o3, o4, startAm, **precision) and returning a
+                          tuple of durations, e.g. voyage_estimator_exact; None for the fastest backend (see
+                          VoyageBackends.get_backend)
+        :param precision: keyword arguments for the estimator, e.g. numSims=5000; these are part of the cache key
+        :return: the estimator's tuple of durations
+        '''
+        if estimator is None:
+            estimator = get_backend()
+        skills = self.__quantize([ps, ss, o1, o2, o3, o4])
+        key = VoyageCache.__key(skills, start_am, estimator.__name__, precision)
+        value = self.__get(key)
+        if value is None:
+            value = tuple(estimator(*skills, start_am, **precision))
+            self.__put(key, value)
+        return value
+
+    def estimate_batch(self, skill_matrix, start_ams, *, batch_estimator=voyage_estimator_batch, **precision):
+        '''
+        Look up voyage estimates for many lineups, running the batch estimator once for all the misses.
+
+        :param skill_matrix: (N, 6) array-like of primary, secondary, other 1-4 skill totals
+        :param start_ams: starting AM of each lineup, or a single starting AM for all of them
+        :param batch_estimator: estimator function taking (skillMatrix, startAms, **precision) and returning an (N, 3)
+                                array, e.g. voyage_estimator_batch
+        :param precision: keyword arguments for the estimator, e.g. numSims=5000; these are part of the cache key
+        :return: list of the estimates for each lineup
+        '''
+        if not hasattr(start_ams, '__len__'):
+            start_ams = [start_ams] * len(skill_matrix)
+
+        lineups = [(self.__quantize(list(skills)), int(start_am)) for skills, start_am in zip(skill_matrix, start_ams)]
+        keys = [VoyageCache.__key(skills, start_am, batch_estimator.__name__, precision)
+                for skills, start_am in lineups]
+        values = [self.__get(key) for key in keys]
+
+        missing = [i for i, value in enumerate(values) if value is None]
+        if len(missing) > 0:
+            estimates = batch_estimator([lineups[i][0] for i in missing], [lineups[i][1] for i in missing],
+                                        **precision)
+            for i, estimate in zip(missing, estimates):
+                values[i] = tuple(estimate.tolist())
+                self.__put(keys[i], values[i])
+
+        return values
+
+    def save(self):
+        '''
+        Write the on-disk tier, dropping the least recently used entries beyond max_disk_entries.
+        '''
+        if self.filepath is None or not self.__disk_dirty:
+            return
+
+        if len(self.__disk) > self.max_disk_entries:
+            newest = sorted(self.__disk.items(), key=lambda item: item[1][1], reverse=True)
+            self.__disk = dict(newest[:self.max_disk_entries])
+
+        print('Writing voyage estimate cache to file...')
+        Path(self.filepath).parent.mkdir(parents=True, exist_ok=True)
+        # write a temporary file and swap it in, so an interrupted save leaves the old file intact
+        fd, temp_path = tempfile.mkstemp(dir=Path(self.filepath).parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.__disk, f)
+            os.replace(temp_path, self.filepath)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.__disk_dirty = False
+
+    def clear(self):
+        self.__memory.clear()
+        self.__disk = {}
+        self.__disk_dirty = True
+        self.hits = self.disk_hits = self.misses = 0
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    '''
+
+    :return: the shared VoyageCache, with its on-disk tier in the Star Trek Timelines folder
+    '''
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = VoyageCache()
+    return _default_cache
+
+
+if __name__ == "__main__":
+    sample_stats = [13000, 12000, 6000, 5000, 4000, 3500, 2700]
+    cache = get_default_cache()
+    for _ in range(3):
+        start = time.time()
+        result = cache.estimate(*sample_stats)
+        print(f'{result} in {time.time() - start:0.4f}s')
+    print(cache)
@@ -2,6 +2,47 @@
 
 import random
 import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+
+HAZ_SKILL_VARIANCE = 0.2
+PS_CHANCE = 0.35
+SS_CHANCE = 0.25
+OS_CHANCE = 0.1
+SECONDS_PER_TICK = 20
+TICKS_PER_HOUR = 60 * 60 / SECONDS_PER_TICK                             # 180
+HAZARD_TICK = 4
+REWARD_TICK = 7
+HAZARD_AS_REWARD_TICK = 28
+HOURS_PER_DILEMMA = 2
+TICKS_PER_DILEMMA = int(HOURS_PER_DILEMMA * TICKS_PER_HOUR)             # 360
+HAZ_SKILL_PER_TICK = 1260 / TICKS_PER_HOUR                              # 7
+HAZ_AM_PASS = 5
+HAZ_AM_FAIL = 30
+MAX_TICKS = 10000
+DIL_PER_MINUTE = 5
+MAX_EXTENDS = 100
+BATCH_CHUNK_SIMS = 1 << 16
+PARALLEL_BLOCK_SIMS = 2500
+EXACT_BATCH_LINEUPS = 64
+
+# Skill picks as a lookup table: every skill chance is a multiple of 1/SKILL_PICK_BINS, so a pick roll in [0, 1)
+# maps to a skill index (0 = primary, 1 = secondary, 2-5 = others) via SKILL_PICK_TABLE[int(roll * SKILL_PICK_BINS)]
+SKILL_CHANCES = np.array([PS_CHANCE, SS_CHANCE] + [OS_CHANCE] * 4)
+SKILL_PICK_BINS = 20
+SKILL_PICK_TABLE = np.repeat(np.arange(6), np.round(SKILL_CHANCES * SKILL_PICK_BINS).astype(np.int64))
+
+# The tick schedule is the same for every voyage: what happens at each tick from 0 to MAX_TICKS
+_TICKS = np.arange(MAX_TICKS + 1)
+IS_HAZARD_TICK = (_TICKS % HAZARD_TICK == 0) & (_TICKS % HAZARD_AS_REWARD_TICK != 0) & (_TICKS % TICKS_PER_DILEMMA != 0)
+IS_ACTIVITY_TICK = ~IS_HAZARD_TICK & (_TICKS % REWARD_TICK != 0) & (_TICKS % HAZARD_AS_REWARD_TICK != 0) & \
+                   (_TICKS % TICKS_PER_DILEMMA != 0)
+HAZARD_TICKS = np.flatnonzero(IS_HAZARD_TICK)
+HAZARD_DIFFS = (HAZARD_TICKS * HAZ_SKILL_PER_TICK).astype(np.int64)
+TICKS_PER_HOUR_INT = int(TICKS_PER_HOUR)
+HOUR_TICKS = np.arange(0, MAX_TICKS + 1, TICKS_PER_HOUR_INT)
 
 
 def time_format(duration):
@@ -10,7 +51,123 @@ def time_format(duration):
     return "{}h {}m".format(hours, minutes)
 
 
-def voyage_estimator_redux(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numSims = 5000):
+class TickHistogram:
+    """
+    Fixed-memory record of simulated voyage durations: the number of voyages that ran out of AM at each tick.  The
+    ave/safe/safer picks are the same as picking from the sorted list of every result, but memory doesn't grow with
+    the number of simulations, and histograms from separate batches or workers merge exactly by adding their counts.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = np.zeros(MAX_TICKS + 1, dtype=np.int64) if counts is None else counts
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def add(self, ticks):
+        """
+        :param ticks: array of the ticks at which simulated voyages ran out of AM
+        """
+        self.counts += np.bincount(np.ravel(ticks), minlength=self.counts.size)
+
+    def add_tick(self, tick, count=1):
+        self.counts[tick] += count
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def tick_at_rank(self, rank):
+        """
+        :param rank: index, or array of indexes, into the sorted list of results
+        :return: the tick of the result at that index
+        """
+        return np.searchsorted(np.cumsum(self.counts), rank, side='right')
+
+    def min_tick(self):
+        return np.argmax(self.counts > 0).item()
+
+    def max_tick(self):
+        return self.counts.size - 1 - np.argmax(self.counts[::-1] > 0).item()
+
+    def survival(self):
+        """
+        :return: array of the fraction of voyages still running after each tick (index 0 is the start of the voyage),
+                 up to the last tick any voyage ran out of AM, in the same form as voyage_estimator_exact's survival
+                 curve
+        """
+        return 1 - np.cumsum(self.counts[:self.max_tick() + 1]) / len(self)
+
+    def pick_ticks(self):
+        """
+        :return: array of the average, safe and safer ticks, picked the same way as voyage_estimator_redux picks them
+                 from its sorted results
+        """
+        numSims = len(self)
+        return self.tick_at_rank([int(numSims / 2), int(numSims / 10), int(numSims / 100)])
+
+    def quantiles(self):
+        """
+        :return: average, safe, safer voyage durations in hours
+        """
+        return tuple((self.pick_ticks() / TICKS_PER_HOUR).tolist())
+
+
+class HourlyAmHistogram:
+    """
+    Fixed-memory record of the AM of simulated voyages at each hour boundary: for each hour, the number of voyages
+    with each amount of AM.  Voyages that have run out of AM count as 0, so only the voyages still running need to be
+    added.  Like TickHistogram, histograms from separate batches merge exactly by adding their counts.
+    """
+
+    def __init__(self):
+        self.counts = []
+
+    def add(self, hour, ams, count=1):
+        """
+        :param hour: hour boundary the AM was recorded at
+        :param ams: array of the AM of voyages at that hour; voyages with AM of 0 or less are left out, as they've
+                    run out of AM
+        :param count: number of voyages each AM stands for
+        """
+        ams = np.ravel(ams)
+        ams = ams[ams > 0]
+        if ams.size > 0:
+            self.__add_counts(hour, np.bincount(ams) * count)
+
+    def __add_counts(self, hour, amCounts):
+        while len(self.counts) <= hour:
+            self.counts.append(np.zeros(0, dtype=np.int64))
+        if amCounts.size > self.counts[hour].size:
+            self.counts[hour] = np.pad(self.counts[hour], (0, amCounts.size - self.counts[hour].size))
+        self.counts[hour][:amCounts.size] += amCounts
+
+    def merge(self, other):
+        for hour, amCounts in enumerate(other.counts):
+            self.__add_counts(hour, amCounts)
+        return self
+
+    def percentiles(self, percentiles, numSims):
+        """
+        :param percentiles: list of percentiles, e.g. [1, 10, 50, 90]
+        :param numSims: total number of voyages simulated, including those that ran out of AM before an hour
+        :return: (hours + 1, len(percentiles)) array of the AM percentiles at each hour boundary from the start of the
+                 voyage to the last hour any voyage was still running, picked the same way as the duration picks
+        """
+        ranks = [int(numSims * percentile / 100) for percentile in percentiles]
+        bands = np.zeros((len(self.counts), len(percentiles)), dtype=np.int64)
+        for hour, amCounts in enumerate(self.counts):
+            if amCounts.size == 0:
+                continue
+            # voyages that ran out of AM before the hour have 0 AM
+            cumulativeCounts = np.cumsum(amCounts)
+            cumulativeCounts += numSims - cumulativeCounts[-1]
+            bands[hour] = np.searchsorted(cumulativeCounts, ranks, side='right')
+        return bands
+
+
+def voyage_estimator_redux(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numSims = 5000, seed=None,
+                           amPercentiles=None):
     """
     Another attempt at implementing the DataCore algorithm to estimate voyage duration.
 
@@ -22,7 +179,11 @@ def voyage_estimator_redux(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numS
     :param o4: other skill 4
     :param startAm: amount of starting antimatter
     :param debug: True to print additional information during execution.
-    :return: list of average, safe, safer estimated voyage durations in hours
+    :param numSims: number of voyages to simulate
+    :param seed: seed for the random number generator; None to seed from the OS
+    :param amPercentiles: list of AM percentiles to also return at each hour boundary, e.g. [1, 10, 50, 90]
+    :return: list of average, safe, safer estimated voyage durations in hours; if amPercentiles is given, followed by
+             an (hours + 1, len(amPercentiles)) array of the AM percentiles at each hour boundary
     """
 
     hazSkillVariance = 0.2
@@ -46,14 +207,17 @@ def voyage_estimator_redux(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numS
     hazAmPass = 5
     hazAmFail = 30
 
-    random.seed()
+    random.seed(seed)
 
-    results = []
+    results = TickHistogram()
+    amHistogram = HourlyAmHistogram()
     for iSim in range(numSims):
         am = startAm
         tick = 0
-        while am > 0:
-            assert tick < 10000
+        # voyages that outlast MAX_TICKS are recorded as running out at MAX_TICKS, as in the other estimators
+        while am > 0 and tick < MAX_TICKS:
+            if amPercentiles is not None and tick % ticksPerHour == 0:
+                amHistogram.add(int(tick // ticksPerHour), am)
             tick += 1
             if tick % hazardTick == 0 and tick % hazardAsRewardTick != 0 and tick % ticksPerDilemma != 0:
                 hazDiff = int(tick * hazSkillPerTick)
@@ -92,19 +256,838 @@ def voyage_estimator_redux(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numS
                 am -= 1
 
         # AM has run out; fell out of while loop
-        results.append(tick / ticksPerHour)
+        results.add_tick(tick)
 
     # Completed all simulations
-    results.sort()
     if debug:
-        print(f'{len(results)} results from {results[0]} to {results[-1]}')
-    aveTime = results[int(len(results) / 2)]
-    safeTime = results[int(len(results) / 10)]
-    saferTime = results[int(len(results) / 100)]
+        print(f'{len(results)} results from {results.min_tick() / ticksPerHour} to {results.max_tick() / ticksPerHour}')
+    aveTime, safeTime, saferTime = results.quantiles()
 
+    if amPercentiles is not None:
+        return aveTime, safeTime, saferTime, amHistogram.percentiles(amPercentiles, numSims)
     return aveTime, safeTime, saferTime
 
 
+def _roll_needed(hazDiff, skillMins, skillMaxs):
+    """
+    The hazard is passed if int(skillMin + roll * (skillMax - skillMin)) >= hazDiff, with roll uniform in [0, 1).
+    Since hazDiff is an integer, that is the same as roll >= (hazDiff - skillMin) / (skillMax - skillMin).
+
+    :return: array of the minimum roll needed to pass the hazard with each skill; 0 for an automatic pass and inf for
+             an automatic fail
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rollNeeded = (hazDiff - skillMins) / (skillMaxs - skillMins)
+    rollNeeded[hazDiff <= skillMins] = 0
+    rollNeeded[hazDiff > skillMaxs] = np.inf
+    return rollNeeded
+
+
+def _skill_bounds(skills):
+    """
+    :param skills: array of skill totals
+    :return: arrays of the lowest and highest possible skill rolls for each skill
+    """
+    skills = np.asarray(skills, dtype=np.int64)
+    return (skills * (1 - HAZ_SKILL_VARIANCE)).astype(np.int64), (skills * (1 + HAZ_SKILL_VARIANCE)).astype(np.int64)
+
+
+def _tick_schedule(skillMins, skillMaxs):
+    """
+    Works out which ticks of a voyage can actually vary between voyages.  Early on, every skill passes every hazard,
+    and late in the voyage every skill fails every hazard, so only the hazards in between need a roll; everything
+    else changes AM the same way in every voyage.  Since hazards only get harder, the rolled hazards are a single run
+    of consecutive hazards.
+
+    :param skillMins: lowest skill rolls, either for one lineup or as an (N, 6) array for N lineups, in which case a
+                      hazard needs a roll if it does for any of the lineups
+    :param skillMaxs: highest skill rolls, in the same shape as skillMins
+    :return: tuple of (rollTicks, amDrift): the ticks of the hazards that need a roll, and the total AM change up to
+             each tick from everything except those hazards
+    """
+    # lowest hazard difficulty that every roll of the skill fails (a roll never reaches skillMax unless it's skillMin)
+    failDiffs = np.where(skillMaxs > skillMins, skillMaxs, skillMaxs + 1)
+    alwaysPass = HAZARD_DIFFS <= skillMins.min()
+    alwaysFail = HAZARD_DIFFS >= failDiffs.max()
+
+    amChange = np.where(IS_ACTIVITY_TICK, -1, 0)
+    amChange[HAZARD_TICKS[alwaysPass]] = HAZ_AM_PASS
+    amChange[HAZARD_TICKS[alwaysFail]] = -HAZ_AM_FAIL
+
+    return HAZARD_TICKS[~alwaysPass & ~alwaysFail], np.cumsum(amChange)
+
+
+def _pass_chances(ticks, skillMins, skillMaxs):
+    """
+    :return: array of the chance of passing the hazard at each of the given ticks
+    """
+    rollNeeded = _roll_needed((ticks * HAZ_SKILL_PER_TICK).astype(np.int64)[:, np.newaxis], skillMins, skillMaxs)
+    return np.clip((1 - np.clip(rollNeeded, 0, 1)) @ SKILL_CHANCES, 0, 1)
+
+
+def _simulate_out_ticks(skillMins, skillMaxs, startAms, numSims, rng, *, paired=False, amHistogram=None):
+    """
+    Simulates numSims voyages for each of N lineups, all in one pass.  Every simulated voyage is advanced together as
+    NumPy arrays, and voyages are dropped from the arrays as their AM runs out.  Only hazards that need a roll are
+    simulated (see _tick_schedule); the ticks in between are skipped over.
+
+    :param skillMins: (N, 6) array of the lowest skill rolls of each lineup
+    :param skillMaxs: (N, 6) array of the highest skill rolls of each lineup
+    :param startAms: array of the starting AM of each lineup
+    :param numSims: number of voyages to simulate for each lineup
+    :param rng: NumPy random Generator
+    :param paired: True for voyage i of every lineup to use the same skill pick and skill rolls at every hazard, so
+                   differences between lineups aren't swamped by differences in luck
+    :param amHistogram: HourlyAmHistogram to add the AM of the voyages at each hour boundary to; one lineup only
+    :return: (N, numSims) array of the ticks at which the simulated voyages ran out of AM
+    """
+    numLineups = startAms.size
+    rollTicks, amDrift = _tick_schedule(skillMins, skillMaxs)
+    outTicks = np.empty((numLineups, numSims), dtype=np.int64)
+    assert amHistogram is None or numLineups == 1
+
+    # Until the first hazard that needs a roll, every voyage of a lineup plays out the same way
+    firstRollTick = rollTicks[0] if rollTicks.size > 0 else MAX_TICKS + 1
+    outBeforeRolls = startAms[:, np.newaxis] + amDrift[:firstRollTick] <= 0
+    rolling = ~outBeforeRolls.any(axis=1)
+    outTicks[~rolling] = np.argmax(outBeforeRolls[~rolling], axis=1)[:, np.newaxis]
+    assert rollTicks.size > 0 or not rolling.any()
+    if amHistogram is not None:
+        lastTick = firstRollTick if rolling[0] else outTicks[0, 0]
+        for hourTick in HOUR_TICKS[HOUR_TICKS < lastTick]:
+            amHistogram.add(hourTick // TICKS_PER_HOUR_INT, startAms[0] + amDrift[hourTick], count=numSims)
+
+    # The voyages still running, flattened across lineups.  am is the starting AM plus the AM won or lost on rolled
+    # hazards, so the AM at a tick is am + amDrift[tick].
+    simIds = np.flatnonzero(np.repeat(rolling, numSims))
+    lineups = simIds // numSims
+    am = startAms[lineups]
+    pickOffsets = lineups * SKILL_PICK_BINS
+    # roll needed to pass each rolled hazard with each skill of each lineup
+    rollNeeded = _roll_needed((rollTicks * HAZ_SKILL_PER_TICK).astype(np.int64)[:, np.newaxis, np.newaxis], skillMins,
+                              skillMaxs)
+    for iRoll, tick in enumerate(rollTicks):
+        if am.size == 0:
+            break
+        if paired:
+            skillPickRoll, skillRoll = rng.random((2, numSims))[:, simIds % numSims]
+        else:
+            skillPickRoll, skillRoll = rng.random((2, am.size))
+        pickRollNeeded = rollNeeded[iRoll][:, SKILL_PICK_TABLE].ravel()
+        passed = skillRoll >= pickRollNeeded[pickOffsets + (skillPickRoll * SKILL_PICK_BINS).astype(np.intp)]
+        am += np.where(passed, HAZ_AM_PASS, -HAZ_AM_FAIL)
+
+        # AM only goes down until the next roll, so voyages that run out before then can be found from the AM at the
+        # end of the span, and when they run out from a search of the span's AM drift
+        spanEnd = rollTicks[iRoll + 1] if iRoll + 1 < rollTicks.size else MAX_TICKS + 1
+        if amHistogram is not None:
+            for hourTick in HOUR_TICKS[(HOUR_TICKS >= tick) & (HOUR_TICKS < spanEnd)]:
+                amHistogram.add(hourTick // TICKS_PER_HOUR_INT, am + amDrift[hourTick])
+        outOfAm = am + amDrift[spanEnd - 1] <= 0
+        if outOfAm.any():
+            outTicks.ravel()[simIds[outOfAm]] = tick + np.searchsorted(-amDrift[tick:spanEnd], am[outOfAm])
+            stillRunning = ~outOfAm
+            simIds = simIds[stillRunning]
+            am = am[stillRunning]
+            pickOffsets = pickOffsets[stillRunning]
+    # voyages that outlast MAX_TICKS are recorded as running out at MAX_TICKS
+    outTicks.ravel()[simIds] = MAX_TICKS
+
+    return outTicks
+
+
+def _out_tick_quantiles(outTicks):
+    """
+    :param outTicks: (N, numSims) array of out-of-AM ticks, as returned by _simulate_out_ticks
+    :return: (N, 3) array of average, safe, safer voyage durations in hours, picked the same way as
+             voyage_estimator_redux picks them from its sorted results
+    """
+    numSims = outTicks.shape[1]
+    ranks = [int(numSims / 2), int(numSims / 10), int(numSims / 100)]
+    return np.partition(outTicks, ranks, axis=1)[:, ranks] / TICKS_PER_HOUR
+
+
+def _simulate_histogram(skillMins, skillMaxs, startAm, numSims, rng, *, amHistogram=None):
+    """
+    Simulates numSims voyages of one lineup in blocks of at most BATCH_CHUNK_SIMS, so memory stays the same however
+    many voyages are simulated.
+
+    :param amHistogram: HourlyAmHistogram to add the AM of the voyages at each hour boundary to
+    :return: TickHistogram of the simulated voyages
+    """
+    histogram = TickHistogram()
+    for iStart in range(0, numSims, BATCH_CHUNK_SIMS):
+        histogram.add(_simulate_out_ticks(skillMins, skillMaxs, np.array([startAm]),
+                                          min(BATCH_CHUNK_SIMS, numSims - iStart), rng, amHistogram=amHistogram))
+    return histogram
+
+
+def voyage_estimator_numpy(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numSims=5000, seed=None, survival=False,
+                           amPercentiles=None):
+    """
+    Vectorized version of voyage_estimator_redux; see _simulate_out_ticks.  The hazard rules and percentile picks are
+    the same as voyage_estimator_redux.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param startAm: amount of starting antimatter
+    :param debug: True to print additional information during execution.
+    :param numSims: number of voyages to simulate
+    :param seed: seed for the random number generator; None to seed from the OS
+    :param survival: True to also return the survival curve, as voyage_estimator_exact does; see dilemma_chances for
+                     the chance of reaching each dilemma
+    :param amPercentiles: list of AM percentiles to also return at each hour boundary, e.g. [1, 10, 50, 90]
+    :return: list of average, safe, safer estimated voyage durations in hours; if survival is True, followed by an
+             array of the fraction of voyages still running after each tick (index 0 is the start of the voyage); if
+             amPercentiles is given, followed by an (hours + 1, len(amPercentiles)) array of the AM percentiles at each
+             hour boundary (see HourlyAmHistogram.percentiles)
+    """
+
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    amHistogram = HourlyAmHistogram() if amPercentiles is not None else None
+    results = _simulate_histogram(skillMins, skillMaxs, startAm, numSims, np.random.default_rng(seed),
+                                  amHistogram=amHistogram)
+    if debug:
+        print(f'{numSims} results from {results.min_tick() / TICKS_PER_HOUR} to '
+              f'{results.max_tick() / TICKS_PER_HOUR}')
+
+    estimate = results.quantiles()
+    if survival:
+        estimate += (results.survival(),)
+    if amPercentiles is not None:
+        estimate += (amHistogram.percentiles(amPercentiles, numSims),)
+    return estimate
+
+
+def voyage_estimator_batch(skillMatrix, startAms, *, numSims=5000, seed=None):
+    """
+    Estimates voyage durations for many lineups at once.  Lineups share simulation passes (see _simulate_out_ticks),
+    so the cost of a call is in the array operations rather than in a Python loop per lineup.
+
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :param numSims: number of voyages to simulate for each lineup
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: (N, 3) array of average, safe, safer estimated voyage durations in hours
+    """
+
+    skillMins, skillMaxs = _skill_bounds(skillMatrix)
+    assert skillMins.ndim == 2 and skillMins.shape[1] == 6, skillMins.shape
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMins.shape[:1])
+    rng = np.random.default_rng(seed)
+
+    # Simulate as many lineups at a time as fit in about BATCH_CHUNK_SIMS voyages, which keeps the arrays small
+    # enough to stay in cache.  Chunks are made of lineups with similar skill ranges, since a chunk has to roll
+    # every hazard that any of its lineups needs a roll for.
+    lineupsPerChunk = max(1, BATCH_CHUNK_SIMS // numSims)
+    order = np.lexsort((skillMins.min(axis=1), skillMaxs.max(axis=1)))
+    results = np.empty((startAms.size, 3))
+    for iStart in range(0, startAms.size, lineupsPerChunk):
+        chunk = order[iStart:iStart + lineupsPerChunk]
+        outTicks = _simulate_out_ticks(skillMins[chunk], skillMaxs[chunk], startAms[chunk], numSims, rng)
+        results[chunk] = _out_tick_quantiles(outTicks)
+
+    return results
+
+
+def _simulate_histogram_block(skillMins, skillMaxs, startAm, numSims, seedSequence):
+    """
+    Process pool entry point for voyage_estimator_parallel: runs _simulate_histogram with its own random stream.
+    """
+    return _simulate_histogram(skillMins, skillMaxs, startAm, numSims, np.random.default_rng(seedSequence))
+
+
+def voyage_estimator_parallel(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numSims=100000, seed=None,
+                              numWorkers=None, executor=None):
+    """
+    voyage_estimator_numpy spread across a process pool, for high-precision estimates.  The simulations are split
+    into blocks of PARALLEL_BLOCK_SIMS, and each block gets its own statistically independent random stream spawned
+    from one master seed.  The split doesn't depend on the number of workers, so the same seed always gives the same
+    results.  Each block returns a TickHistogram, and the histograms are merged.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param startAm: amount of starting antimatter
+    :param debug: True to print additional information during execution.
+    :param numSims: number of voyages to simulate
+    :param seed: master seed for the random number generators; None to seed from the OS
+    :param numWorkers: number of worker processes; None for one per CPU
+    :param executor: an existing concurrent.futures executor to run the blocks on, instead of starting a new process
+                     pool for this call
+    :return: list of average, safe, safer estimated voyage durations in hours
+    """
+
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    blockSizes = [PARALLEL_BLOCK_SIMS] * (numSims // PARALLEL_BLOCK_SIMS)
+    if numSims % PARALLEL_BLOCK_SIMS > 0:
+        blockSizes.append(numSims % PARALLEL_BLOCK_SIMS)
+    seedSequences = np.random.SeedSequence(seed).spawn(len(blockSizes))
+    if debug:
+        print(f'Running {numSims} simulations in {len(blockSizes)} blocks with master seed '
+              f'{seedSequences[0].entropy}')
+
+    blockArgs = ([skillMins] * len(blockSizes), [skillMaxs] * len(blockSizes), [startAm] * len(blockSizes),
+                 blockSizes, seedSequences)
+    results = TickHistogram()
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            for block in executor.map(_simulate_histogram_block, *blockArgs):
+                results.merge(block)
+    else:
+        for block in executor.map(_simulate_histogram_block, *blockArgs):
+            results.merge(block)
+
+    if debug:
+        print(f'{numSims} results from {results.min_tick() / TICKS_PER_HOUR} to '
+              f'{results.max_tick() / TICKS_PER_HOUR}')
+
+    return results.quantiles()
+
+
+def _simulate_weighted_out_ticks(skillMins, skillMaxs, startAm, tilt, numSims, rng, *, tiltedFraction=0.5,
+                                 antithetic=False):
+    """
+    Importance-sampled version of _simulate_out_ticks for one lineup.  Since only passing or failing a hazard
+    matters, each rolled hazard is simulated as a single pass/fail roll with the hazard's overall pass chance.  A
+    tiltedFraction of the voyages roll with the log-odds of passing lowered by tilt, which oversamples the unlucky
+    voyages in the lower tail; the rest roll with the true pass chances.  Each voyage is weighted by the likelihood
+    ratio of the mix of the two against the true pass chances, so the weights are never more than
+    1 / (1 - tiltedFraction).
+
+    :param skillMins: (1, 6) array of the lowest skill rolls of the lineup
+    :param skillMaxs: (1, 6) array of the highest skill rolls of the lineup
+    :param startAm: starting AM
+    :param tilt: how much to lower the log-odds of passing each hazard for the tilted voyages
+    :param numSims: number of voyages to simulate
+    :param rng: NumPy random Generator
+    :param tiltedFraction: fraction of the voyages that roll with tilted pass chances
+    :param antithetic: True for the untilted voyages to come in antithetic pairs, the second of each pair rolling
+                       1 - roll wherever the first rolls roll
+    :return: tuple of arrays of the ticks at which the simulated voyages ran out of AM, and their weights
+    """
+    rollTicks, amDrift = _tick_schedule(skillMins, skillMaxs)
+    passChances = np.clip(_pass_chances(rollTicks, skillMins[0], skillMaxs[0]), 1e-12, 1 - 1e-12)
+    tiltedChances = 1 / (1 + (1 - passChances) / passChances * math.exp(tilt))
+    passRatios = np.log(tiltedChances / passChances)
+    failRatios = np.log((1 - tiltedChances) / (1 - passChances))
+
+    numTilted = int(numSims * tiltedFraction)
+    numPairs = (numSims - numTilted) // 2 if antithetic else 0
+    outTicks = np.empty(numSims, dtype=np.int64)
+    logRatios = np.zeros(numSims)
+
+    firstRollTick = rollTicks[0] if rollTicks.size > 0 else MAX_TICKS + 1
+    outBeforeRolls = np.flatnonzero(startAm + amDrift[:firstRollTick] <= 0)
+    if outBeforeRolls.size > 0:
+        outTicks[:] = outBeforeRolls[0]
+        return outTicks, np.ones(numSims)
+
+    simIds = np.arange(numSims)
+    am = np.full(numSims, startAm, dtype=np.int64)
+    for iRoll, tick in enumerate(rollTicks):
+        if am.size == 0:
+            break
+        rolls = rng.random(numSims)
+        rolls[numTilted + numPairs:numTilted + 2 * numPairs] = 1 - rolls[numTilted:numTilted + numPairs]
+        tilted = simIds < numTilted
+        passed = rolls[simIds] < np.where(tilted, tiltedChances[iRoll], passChances[iRoll])
+        am += np.where(passed, HAZ_AM_PASS, -HAZ_AM_FAIL)
+        logRatios[simIds] += np.where(passed, passRatios[iRoll], failRatios[iRoll])
+
+        spanEnd = rollTicks[iRoll + 1] if iRoll + 1 < rollTicks.size else MAX_TICKS + 1
+        outOfAm = am + amDrift[spanEnd - 1] <= 0
+        if outOfAm.any():
+            outTicks[simIds[outOfAm]] = tick + np.searchsorted(-amDrift[tick:spanEnd], am[outOfAm])
+            stillRunning = ~outOfAm
+            simIds = simIds[stillRunning]
+            am = am[stillRunning]
+    outTicks[simIds] = MAX_TICKS
+
+    weights = 1 / (1 - tiltedFraction + tiltedFraction * np.exp(logRatios))
+    return outTicks, weights
+
+
+def voyage_estimator_tail(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, numSims=2000, tilt=None, antithetic=True,
+                          seed=None):
+    """
+    Version of voyage_estimator_numpy that spends half its simulations on unlucky voyages, so the safer (1%) estimate
+    is as precise as voyage_estimator_numpy's with several times fewer simulations; see _simulate_weighted_out_ticks.
+    The safe and safer estimates are the quantiles of the weighted voyages.
+
+    Only the tail estimates gain from the tilt.  The weights add noise around the median, so the average estimate comes
+    from the untilted half of the voyages alone, and is only as precise as voyage_estimator_numpy's with that many
+    simulations; use voyage_estimator_numpy when the average is what matters.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param startAm: amount of starting antimatter
+    :param debug: True to print additional information during execution.
+    :param numSims: number of voyages to simulate
+    :param tilt: how much to lower the log-odds of passing each hazard for the unlucky voyages; None to pick a tilt
+                 that puts the typical unlucky voyage near the 1% quantile, from the spread of the number of hazards
+                 failed by the average voyage
+    :param antithetic: True to simulate the rest of the voyages in antithetic pairs
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: list of average, safe, safer estimated voyage durations in hours
+    """
+
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    rng = np.random.default_rng(seed)
+    if tilt is None:
+        # The number of hazards failed by the median voyage has a variance of sum(p * (1 - p)), and lowering the
+        # log-odds by tilt shifts it by about tilt * sum(p * (1 - p)), so shift it by 2.33 standard deviations
+        rollTicks, _ = _tick_schedule(skillMins, skillMaxs)
+        medianTick = _simulate_histogram(skillMins, skillMaxs, startAm, 200, rng).pick_ticks()[0]
+        passChances = _pass_chances(rollTicks[rollTicks <= medianTick], skillMins[0], skillMaxs[0])
+        variance = np.sum(passChances * (1 - passChances))
+        tilt = NormalDist().inv_cdf(0.99) / math.sqrt(variance) if variance > 0 else 0
+
+    tiltedFraction = 0.5
+    outTicks, weights = _simulate_weighted_out_ticks(skillMins, skillMaxs, startAm, tilt, numSims, rng,
+                                                     tiltedFraction=tiltedFraction, antithetic=antithetic)
+    cumulativeWeights = np.cumsum(np.bincount(outTicks, weights=weights, minlength=MAX_TICKS + 1))
+    picks = np.searchsorted(cumulativeWeights, cumulativeWeights[-1] * np.array([0.5, 0.1, 0.01]), side='right')
+    # the untilted voyages are the last ones, and on their own follow the true pass chances
+    untiltedTicks = outTicks[int(numSims * tiltedFraction):]
+    picks[0] = np.partition(untiltedTicks, int(untiltedTicks.size / 2))[int(untiltedTicks.size / 2)]
+    if debug:
+        effectiveSims = weights.sum() ** 2 / np.sum(weights ** 2)
+        print(f'tilt {tilt:.3f}: {numSims} weighted results from {outTicks.min() / TICKS_PER_HOUR} to '
+              f'{outTicks.max() / TICKS_PER_HOUR}, effective sample size {effectiveSims:.0f}')
+
+    return tuple((picks / TICKS_PER_HOUR).tolist())
+
+
+class AdaptiveEstimate:
+
+    def __init__(self):
+        self.result = None
+        self.safeResult = None
+        self.saferResult = None
+        self.intervals = None
+        self.confidence = None
+        self.numSims = None
+
+    def __str__(self):
+        return ', '.join([f'{time_format(estimate)} ({time_format(low)} to {time_format(high)})'
+                          for estimate, (low, high) in zip([self.result, self.safeResult, self.saferResult],
+                                                           self.intervals)]) + \
+            f' at {self.confidence:.0%} confidence from {self.numSims} simulations'
+
+
+def _quantile_intervals(results, confidence):
+    """
+    Distribution-free confidence intervals on the ave/safe/safer picks from a set of simulated voyages: the number of
+    results below a quantile is binomial, so the interval runs between the results whose ranks are z standard
+    deviations either side of the pick.
+
+    :param results: TickHistogram of the simulated voyages
+    :param confidence: confidence level of the intervals, e.g. 0.95
+    :return: (3, 2) array of the lowest and highest ticks of the average, safe and safer intervals
+    """
+    numSims = len(results)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    ranks = np.empty((3, 2), dtype=np.int64)
+    for iPick, q in enumerate((0.5, 0.1, 0.01)):
+        spread = z * math.sqrt(numSims * q * (1 - q))
+        ranks[iPick] = max(0, math.floor(numSims * q - spread)), min(numSims - 1, math.ceil(numSims * q + spread))
+    return results.tick_at_rank(ranks)
+
+
+def voyage_estimator_adaptive(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, toleranceMinutes=5, confidence=0.95,
+                              blockSims=500, maxSims=100000, seed=None):
+    """
+    Runs simulations in blocks of blockSims until the confidence intervals on the average, safe and safer durations
+    are all within toleranceMinutes of the estimates, so easy lineups stop early and only lineups with a wide tail
+    get more simulations.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param startAm: amount of starting antimatter
+    :param debug: True to print additional information during execution.
+    :param toleranceMinutes: largest acceptable distance from an estimate to either end of its confidence interval
+    :param confidence: confidence level of the intervals
+    :param blockSims: number of voyages to simulate between convergence checks
+    :param maxSims: number of voyages after which to stop even if the intervals haven't converged
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: AdaptiveEstimate with the average, safe, safer estimated voyage durations in hours, their confidence
+             intervals and the number of simulations used
+    """
+
+    rng = np.random.default_rng(seed)
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    tolerance = toleranceMinutes * TICKS_PER_HOUR / 60
+
+    results = TickHistogram()
+    while len(results) < maxSims:
+        results.add(_simulate_out_ticks(skillMins, skillMaxs, np.array([startAm]),
+                                        min(blockSims, maxSims - len(results)), rng))
+        picks = results.pick_ticks()
+        intervals = _quantile_intervals(results, confidence)
+        halfWidths = np.maximum(picks - intervals[:, 0], intervals[:, 1] - picks)
+        if debug:
+            print(f'{len(results)} sims: ave/safe/safer within {halfWidths * 60 / TICKS_PER_HOUR} minutes')
+        if (halfWidths <= tolerance).all():
+            break
+
+    estimate = AdaptiveEstimate()
+    estimate.result, estimate.safeResult, estimate.saferResult = (picks / TICKS_PER_HOUR).tolist()
+    estimate.intervals = [tuple(interval) for interval in (intervals / TICKS_PER_HOUR).tolist()]
+    estimate.confidence = confidence
+    estimate.numSims = len(results)
+    return estimate
+
+
+class LineupComparison:
+
+    def __init__(self):
+        self.results = None
+        self.differences = None
+        self.intervals = None
+        self.confidence = None
+        self.numSims = None
+
+    def __str__(self):
+        lines = []
+        for iLineup, (results, differences, intervals) in enumerate(zip(self.results, self.differences,
+                                                                        self.intervals)):
+            lines.append(f'Lineup {iLineup}: ' + ', '.join(
+                [f'{time_format(result)} ({60 * difference:+.1f}m, {60 * low:+.1f}m to {60 * high:+.1f}m)'
+                 for result, difference, (low, high) in zip(results, differences, intervals)]))
+        return '\n'.join(lines) + f'\nat {self.confidence:.0%} confidence from {self.numSims} paired simulations'
+
+
+def _paired_resampled_differences(outTicks, numResamples, rng):
+    """
+    Paired bootstrap of the differences between lineups simulated on common random numbers: the voyages are resampled
+    numResamples times, with the same resampled voyages for every lineup.
+
+    :param outTicks: (N, numSims) array of out-of-AM ticks from _simulate_out_ticks with paired=True
+    :param numResamples: number of bootstrap resamples
+    :param rng: NumPy random Generator
+    :return: (N, numResamples, 3) array of the differences of each lineup's resampled average, safe, safer estimates
+             from the first lineup's, in hours
+    """
+    numSims = outTicks.shape[1]
+    resamples = rng.integers(numSims, size=(numResamples, numSims))
+    ranks = [int(numSims / 2), int(numSims / 10), int(numSims / 100)]
+    resampledResults = np.stack([np.partition(lineupTicks[resamples], ranks, axis=1)[:, ranks]
+                                 for lineupTicks in outTicks]) / TICKS_PER_HOUR
+    return resampledResults - resampledResults[0]
+
+
+def _paired_difference_intervals(outTicks, confidence, numResamples, rng):
+    """
+    :param outTicks: (N, numSims) array of out-of-AM ticks from _simulate_out_ticks with paired=True
+    :param confidence: confidence level of the intervals
+    :param numResamples: number of bootstrap resamples (see _paired_resampled_differences)
+    :param rng: NumPy random Generator
+    :return: (N, 3, 2) array of the low and high ends of the confidence intervals on the differences of each lineup's
+             average, safe, safer estimates from the first lineup's, in hours
+    """
+    resampledDifferences = _paired_resampled_differences(outTicks, numResamples, rng)
+    return np.moveaxis(np.quantile(resampledDifferences, [(1 - confidence) / 2, (1 + confidence) / 2], axis=1), 0, -1)
+
+
+def voyage_comparison(skillMatrix, startAms, *, numSims=5000, confidence=0.95, numResamples=500, seed=None):
+    """
+    Compares lineups using common random numbers: voyage i of every lineup sees the same skill picks and skill rolls
+    (see _simulate_out_ticks), so the differences between the lineups' estimates are mostly down to the lineups
+    rather than luck, and far fewer simulations are needed to rank them than with independent estimates.
+
+    Confidence intervals on the differences come from a paired bootstrap: the simulated voyages are resampled
+    numResamples times, with the same resampled voyages for every lineup.
+
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :param numSims: number of paired voyages to simulate
+    :param confidence: confidence level of the intervals
+    :param numResamples: number of bootstrap resamples
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: LineupComparison with the average, safe, safer estimated voyage durations of each lineup in hours, their
+             differences from the first lineup's, and the confidence intervals on those differences
+    """
+
+    skillMins, skillMaxs = _skill_bounds(skillMatrix)
+    assert skillMins.ndim == 2 and skillMins.shape[1] == 6, skillMins.shape
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMins.shape[:1])
+    rng = np.random.default_rng(seed)
+
+    outTicks = _simulate_out_ticks(skillMins, skillMaxs, startAms, numSims, rng, paired=True)
+    results = _out_tick_quantiles(outTicks)
+
+    comparison = LineupComparison()
+    comparison.results = results
+    comparison.differences = results - results[0]
+    comparison.intervals = _paired_difference_intervals(outTicks, confidence, numResamples, rng)
+    comparison.confidence = confidence
+    comparison.numSims = numSims
+    return comparison
+
+
+def _survival_quantiles(survivalCurve):
+    """
+    :param survivalCurve: array of the chance that the voyage is still running after each tick
+    :return: average, safe, safer voyage durations in hours, i.e. the first ticks by which 50%, 10% and 1% of voyages
+             have run out of AM; these are the exact equivalents of the sorted-results picks voyage_estimator_redux
+             makes; voyages still running at the end of the curve count as lasting MAX_TICKS, as in the simulations
+    """
+    quantileTicks = []
+    for q in (0.5, 0.1, 0.01):
+        below = survivalCurve < 1 - q
+        quantileTicks.append(np.argmax(below).item() if below.any() else MAX_TICKS)
+    return tuple(tick / TICKS_PER_HOUR for tick in quantileTicks)
+
+
+class LineupRace:
+
+    def __init__(self):
+        self.winner = None
+        self.survivors = None
+        self.results = None
+        self.rounds = None
+        self.totalSims = None
+
+    def __str__(self):
+        lines = [f'Round {iRound}: {numLineups} lineups x {numSims} sims'
+                 for iRound, (numLineups, numSims) in enumerate(self.rounds)]
+        lines.append(f'Lineup {self.winner} won: ' + ', '.join([time_format(t) for t in self.results[0]]) +
+                     f' after {self.totalSims} sims in total')
+        return '\n'.join(lines)
+
+
+def voyage_race(skillMatrix, startAms, *, startSims=250, simBudget=None, maxSims=100000, objective=0,
+                confidence=0.95, numResamples=500, seed=None):
+    """
+    Picks the best of many lineups by successive halving: every lineup is simulated with startSims voyages, lineups in
+    the worse half that lose to the leader are dropped, and the rest are simulated again with twice as many, until one
+    lineup is left or the next round would go over simBudget or maxSims.  Each round adds to the voyages simulated in
+    earlier rounds, and the lineups are compared on the same random numbers (see voyage_comparison), so most of the
+    simulations go into telling apart the few lineups that are close.
+
+    A lineup only loses to the leader when the confidence interval on its paired difference from the leader is below
+    zero, so lineups that are too close to call stay in the race rather than being dropped on noise.  The first round
+    counts against simBudget too: if startSims voyages of every lineup don't fit, it simulates as many as do.
+
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :param startSims: number of voyages to simulate for each lineup in the first round
+    :param simBudget: most voyages to simulate in total; None for no limit
+    :param maxSims: most voyages to simulate for any one lineup, which ends races between lineups that can't be told
+                    apart
+    :param objective: which estimate to rank lineups by: 0 for average, 1 for safe, 2 for safer
+    :param confidence: confidence level of the comparisons with the leader
+    :param numResamples: number of bootstrap resamples for the comparisons
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: LineupRace with the index of the winning lineup, the indices of the lineups left at the end, best first,
+             their average, safe, safer estimated voyage durations in hours, the (lineups, sims) of each round, and
+             the total number of voyages simulated
+    """
+
+    skillMins, skillMaxs = _skill_bounds(skillMatrix)
+    assert skillMins.ndim == 2 and skillMins.shape[1] == 6, skillMins.shape
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMins.shape[:1])
+    rng = np.random.default_rng(seed)
+
+    race = LineupRace()
+    race.rounds = []
+    race.totalSims = 0
+    survivors = np.arange(startAms.size)
+    outTicks = np.empty((startAms.size, 0), dtype=np.int64)
+    numSims = startSims
+    if simBudget is not None:
+        numSims = min(startSims, simBudget // startAms.size)
+        if numSims == 0:
+            raise ValueError(f'simBudget {simBudget} is too small to simulate each of the {startAms.size} lineups once')
+    while True:
+        if simBudget is not None and race.totalSims + survivors.size * numSims > simBudget:
+            break
+        if race.totalSims > 0 and outTicks.shape[1] + numSims > maxSims:
+            break
+        outTicks = np.concatenate((outTicks, _simulate_out_ticks(skillMins[survivors], skillMaxs[survivors],
+                                                                 startAms[survivors], numSims, rng, paired=True)),
+                                  axis=1)
+        race.rounds.append((survivors.size, numSims))
+        race.totalSims += survivors.size * numSims
+        results = _out_tick_quantiles(outTicks)
+        order = np.argsort(-results[:, objective], kind='stable')
+        survivors, outTicks, results = survivors[order], outTicks[order], results[order]
+        if survivors.size > 1:
+            intervals = _paired_difference_intervals(outTicks, confidence, numResamples, rng)[:, objective]
+            keep = (np.arange(survivors.size) < math.ceil(survivors.size / 2)) | (intervals[:, 1] >= 0)
+            survivors, outTicks, results = survivors[keep], outTicks[keep], results[keep]
+        if survivors.size == 1:
+            break
+        numSims *= 2
+
+    race.survivors = survivors
+    race.results = results[:survivors.size]
+    race.winner = survivors[0].item()
+    return race
+
+
+def _exact_survival_curves(skillMins, skillMaxs, startAms, startTick=0):
+    """
+    The survival curves of voyage_estimator_exact for many lineups at once, for voyages with startAms at startTick.
+    Every lineup's failure-count distribution is a row of one array, so each rolled hazard is carried forward for all
+    of them in one pass.  The lineups share a tick schedule (see _tick_schedule); a hazard that only needs a roll for
+    some of them is passed with a chance of 0 or 1 by the rest, so their curves come out the same as on their own.
+
+    :param skillMins: (N, 6) array of the lowest skill rolls of each lineup
+    :param skillMaxs: (N, 6) array of the highest skill rolls of each lineup
+    :param startAms: array of the AM of each lineup at startTick
+    :param startTick: tick the voyages have reached; they play out from the tick after
+    :return: (N, MAX_TICKS + 1) array of the chance that each lineup's voyage is still running after each tick (index
+             0 is the start of the voyage)
+    """
+    numLineups = startAms.size
+    rollTicks, amDrift = _tick_schedule(skillMins, skillMaxs)
+    rollTicks = rollTicks[rollTicks > startTick]
+    # passChances[iRoll, iLineup]
+    passChances = _pass_chances(rollTicks[:, np.newaxis], skillMins, skillMaxs)
+    # AM at a tick is base + amDrift[tick] plus the AM won or lost on rolled hazards since the start tick
+    base = (startAms - amDrift[startTick])[:, np.newaxis]
+
+    survivalCurves = np.zeros((numLineups, MAX_TICKS + 1))
+    survivalCurves[:, :startTick + 1] = 1
+    firstRollTick = rollTicks[0] if rollTicks.size > 0 else MAX_TICKS + 1
+    outBeforeRolls = base + amDrift[startTick + 1:firstRollTick] <= 0
+    survivalCurves[:, startTick + 1:firstRollTick] = np.cumsum(outBeforeRolls, axis=1) == 0
+
+    # failChances[i, k] is the chance that lineup i is still running with k rolled hazards failed so far
+    failChances = (~outBeforeRolls.any(axis=1))[:, np.newaxis].astype(np.float64)
+    failCounts = np.arange(rollTicks.size + 1)
+    lineupOffsets = np.arange(numLineups)[:, np.newaxis]
+    for iRoll, tick in enumerate(rollTicks):
+        passChance = passChances[iRoll][:, np.newaxis]
+        numFailCounts = failChances.shape[1] + 1
+        nextFailChances = np.zeros((numLineups, numFailCounts))
+        nextFailChances[:, :-1] = failChances * passChance
+        nextFailChances[:, 1:] += failChances * (1 - passChance)
+        failChances = nextFailChances
+
+        # With k failures the AM is base + amDrift + 5 * rolls - 35k, so voyages with at least minFailsOut failures
+        # are out of AM; minFailsOut only goes down until the next roll
+        spanEnd = rollTicks[iRoll + 1] if iRoll + 1 < rollTicks.size else MAX_TICKS + 1
+        amNoFails = base + amDrift[tick:spanEnd] + HAZ_AM_PASS * (iRoll + 1)
+        minFailsOut = np.minimum(np.maximum(-(-amNoFails // (HAZ_AM_PASS + HAZ_AM_FAIL)), 0), numFailCounts)
+        cumulativeChances = np.zeros((numLineups, numFailCounts + 1))
+        np.cumsum(failChances, axis=1, out=cumulativeChances[:, 1:])
+        survivalCurves[:, tick:spanEnd] = cumulativeChances.ravel()[lineupOffsets * (numFailCounts + 1) + minFailsOut]
+        lastMinFailsOut = minFailsOut[:, -1:]
+        failChances = failChances[:, :lastMinFailsOut.max()]
+        if failChances.shape[1] == 0:
+            break
+        if numLineups > 1:
+            failChances[failCounts[:failChances.shape[1]] >= lastMinFailsOut] = 0
+    return survivalCurves
+
+
+def _exact_survival_curve(skillMins, skillMaxs, startAm, startTick=0):
+    """
+    The survival curve of voyage_estimator_exact, for a voyage with startAm at startTick, e.g. just after a refill.
+
+    :param skillMins: array of the lowest skill rolls of the lineup
+    :param skillMaxs: array of the highest skill rolls of the lineup
+    :param startAm: AM at startTick
+    :param startTick: tick the voyage has reached; it plays out from the tick after
+    :return: array of the chance that the voyage is still running after each tick (index 0 is the start of the
+             voyage), up to the tick by which every voyage has run out of AM, or MAX_TICKS
+    """
+    survivalCurve = _exact_survival_curves(skillMins[np.newaxis], skillMaxs[np.newaxis], np.array([startAm]),
+                                           startTick)[0]
+    outTicks = np.flatnonzero(survivalCurve == 0)
+    return survivalCurve[:outTicks[0] + 1] if outTicks.size > 0 else survivalCurve
+
+
+def voyage_estimator_exact(ps, ss, o1, o2, o3, o4, startAm, *, debug=False, survival=False):
+    """
+    Deterministic equivalent of voyage_estimator_redux.  Each hazard is passed with a chance that depends only on the
+    tick and the skills, so rather than sampling voyages, the distribution of voyage states is carried forward exactly
+    from one rolled hazard to the next until every voyage has run out of AM.
+
+    The state is the number of rolled hazards failed so far: everything else changes AM the same way in every voyage
+    (see _tick_schedule), so the failure count alone determines the AM.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param startAm: amount of starting antimatter
+    :param debug: True to print additional information during execution.
+    :param survival: True to also return the survival curve; see dilemma_chances for the chance of reaching each
+                     dilemma
+    :return: list of average, safe, safer estimated voyage durations in hours; if survival is True, followed by an
+             array of the chance that the voyage is still running after each tick (index 0 is the start of the voyage)
+    """
+
+    skillMins, skillMaxs = _skill_bounds([ps, ss, o1, o2, o3, o4])
+    survivalCurve = _exact_survival_curve(skillMins, skillMaxs, startAm)
+
+    aveTime, safeTime, saferTime = _survival_quantiles(survivalCurve)
+    if debug:
+        print(f'Voyages run out of AM from {np.argmax(survivalCurve < 1) / TICKS_PER_HOUR} to '
+              f'{(survivalCurve.size - 1) / TICKS_PER_HOUR}')
+
+    if survival:
+        return aveTime, safeTime, saferTime, survivalCurve
+    return aveTime, safeTime, saferTime
+
+
+def voyage_estimator_exact_batch(skillMatrix, startAms, *, survival=False):
+    """
+    voyage_estimator_exact for many lineups at once: their survival curves are worked out together (see
+    _exact_survival_curves), so the cost of a call is in the array operations rather than in a Python loop per lineup.
+
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :param survival: True to also return the survival curves
+    :return: (N, 3) array of average, safe, safer estimated voyage durations in hours; if survival is True, in a tuple
+             with an (N, MAX_TICKS + 1) array of the chance that each voyage is still running after each tick
+    """
+
+    skillMins, skillMaxs = _skill_bounds(skillMatrix)
+    assert skillMins.ndim == 2 and skillMins.shape[1] == 6, skillMins.shape
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMins.shape[:1])
+
+    # Chunks are made of lineups with similar skill ranges, as in voyage_estimator_batch, since a chunk has to carry
+    # forward every hazard that any of its lineups needs a roll for
+    order = np.lexsort((skillMins.min(axis=1), skillMaxs.max(axis=1)))
+    survivalCurves = np.empty((startAms.size, MAX_TICKS + 1))
+    for iStart in range(0, startAms.size, EXACT_BATCH_LINEUPS):
+        chunk = order[iStart:iStart + EXACT_BATCH_LINEUPS]
+        survivalCurves[chunk] = _exact_survival_curves(skillMins[chunk], skillMaxs[chunk], startAms[chunk])
+
+    # the first ticks by which 50%, 10% and 1% of voyages have run out of AM, as in _survival_quantiles
+    below = survivalCurves[:, np.newaxis, :] < 1 - np.array([0.5, 0.1, 0.01])[:, np.newaxis]
+    results = np.where(below.any(axis=2), np.argmax(below, axis=2), MAX_TICKS) / TICKS_PER_HOUR
+    if survival:
+        return results, survivalCurves
+    return results
+
+
 def voyage_estimator_simple(ps, ss, o1, o2, o3, o4, startAm, debug=False): #, numExtends=2, currentAm=0, elapsedHours=0):
     if min(ps, ss, o1, o2, o3, o4, startAm) <= 0:
         raise Exception('invalid parameters')
@@ -174,84 +1157,224 @@ def voyage_estimator_simple(ps, ss, o1, o2, o3, o4, startAm, debug=False): #, nu
     return estimates
 
 
-def ratio_optimizer():
+def voyage_estimator_simple_batch(skillMatrix, startAms):
+    """
+    voyage_estimator_simple for many lineups at once, as one matrix product.
 
-    class Swaps:
-        __pairs = None
-        __starting_state = None
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :return: (N, 3) array of average, safe, safer estimated voyage durations in hours
+    """
+    # the same approximation as voyage_estimator_simple: hours of AM from the start, plus each skill's pick chance
+    # times its (luck-adjusted) skill
+    amPerHour = 1260
+    profVariance = 20 / 100
+    profs = np.array([1, 1 - profVariance * 0.90 / 2, 1 - profVariance * 0.99 / 2])
+    pickChances = np.array([0.35, 0.25, 0.1, 0.1, 0.1, 0.1])
 
-        def __init__(self):
-            if self.__starting_state is not None:
-                self.__pairs = self.__starting_state
-                return
+    skillMatrix = np.asarray(skillMatrix, dtype=np.int64)
+    assert skillMatrix.ndim == 2 and skillMatrix.shape[1] == 6, skillMatrix.shape
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMatrix.shape[:1])
+    return (np.outer(skillMatrix @ pickChances, profs) + startAms[:, np.newaxis]) / amPerHour
 
-            self.__pairs = set()
-            for i in range(6):
-                for j in range (6):
-                    if i == j:
-                        continue
-                    self.__pairs.add((i,j))
 
-            self.__starting_state = self.__pairs.copy()
+class LineupScreen:
 
-        def __str__(self):
-            return str(sorted(self.__pairs))
+    def __init__(self):
+        self.kept = None
+        self.results = None
+        self.simpleResults = None
+        self.falseNegativeRate = None
+        self.bestDiscarded = None
 
-        def __len__(self):
-            return len(self.__pairs)
+    def __str__(self):
+        s = f'Kept {self.kept.size} of {self.simpleResults.shape[0]} lineups'
+        if self.falseNegativeRate is not None:
+            s += f', missing {self.falseNegativeRate:.0%} of the true top {self.kept.size}' + \
+                 (' including the best' if self.bestDiscarded else '')
+        return s
 
-        def __iter__(self):
-            return self.__pairs.__iter__()
 
-        def __contains__(self, item):
-            return self.__pairs.__iter__()
+def voyage_screen(skillMatrix, startAms, *, keepFraction=0.05, minKeep=1, objective=0, validate=False,
+                  batchEstimator=None, numSims=5000, seed=None):
+    """
+    Two-stage estimate of many lineups: all of them are ranked with voyage_estimator_simple_batch, which costs next to
+    nothing, and only the top keepFraction are simulated.
+
+    The screen ignores skill variance, so it can throw out a lineup that simulation would rank in the top.  With
+    validate, every lineup is also simulated, and the fraction of the simulated top lineups that the screen threw out
+    is reported as the false-negative rate, to help pick keepFraction.
+
+    :param skillMatrix: (N, 6) array-like of skill totals, one lineup per row, in the order primary, secondary, other
+                        skills 1-4
+    :param startAms: starting AM of each lineup, or a single starting AM for all of them
+    :param keepFraction: fraction of the lineups to simulate
+    :param minKeep: fewest lineups to simulate
+    :param objective: which estimate to rank lineups by: 0 for average, 1 for safe, 2 for safer
+    :param validate: True to simulate every lineup and work out the screen's false-negative rate
+    :param batchEstimator: function taking (skillMatrix, startAms) and returning an (N, 3) array of estimates; None for
+                           voyage_estimator_batch with numSims and seed
+    :param numSims: number of voyages to simulate for each lineup, with the default batchEstimator
+    :param seed: seed for the random number generator, with the default batchEstimator; None to seed from the OS
+    :return: LineupScreen with the indices of the kept lineups, best first by the screen, and their simulated average,
+             safe, safer estimated voyage durations in hours
+    """
+    if batchEstimator is None:
+        def batchEstimator(skills, ams):
+            return voyage_estimator_batch(skills, ams, numSims=numSims, seed=seed)
+
+    skillMatrix = np.asarray(skillMatrix, dtype=np.int64)
+    startAms = np.broadcast_to(np.asarray(startAms, dtype=np.int64), skillMatrix.shape[:1])
+    screen = LineupScreen()
+    screen.simpleResults = voyage_estimator_simple_batch(skillMatrix, startAms)
+    numKeep = min(max(minKeep, math.ceil(keepFraction * startAms.size)), startAms.size)
+    screen.kept = np.argsort(-screen.simpleResults[:, objective], kind='stable')[:numKeep]
+
+    if validate:
+        allResults = np.asarray(batchEstimator(skillMatrix, startAms))
+        screen.results = allResults[screen.kept]
+        trueTop = np.argsort(-allResults[:, objective], kind='stable')[:numKeep]
+        screen.falseNegativeRate = np.setdiff1d(trueTop, screen.kept).size / numKeep
+        screen.bestDiscarded = trueTop[0] not in screen.kept
+    else:
+        screen.results = np.asarray(batchEstimator(skillMatrix[screen.kept], startAms[screen.kept]))
+    return screen
+
 
-        def pop(self):
-            return self.__pairs.pop()
+def ratio_optimizer(totalSkill=44000, startAm=2700, *, skills=None, objective=0, numSims=None, seed=None,
+                    startStep=1000, minStep=10, numResamples=200, debug=False):
+    """
+    Finds the split of a total skill budget between the six voyage skills that maximizes the estimated voyage
+    duration, by pattern search: each step scores every move of step skill points from one skill to another, all in
+    one batch, and takes the best improving move, along with a pattern move repeating the last successful one.  When
+    no move improves, the step is halved, until it drops below minStep.
+
+    Exact estimates (see voyage_estimator_exact_batch) are cached by lineup, with the other skills sorted since their
+    order doesn't change the estimate, so lineups revisited by the search aren't estimated again.
+
+    With numSims, the current lineup and the moves of a step are simulated together on common random numbers (see
+    voyage_comparison).  The best of so many noisy moves tends to look better than it is, so it's simulated against
+    the current lineup again on fresh random numbers, and only taken if it's ahead there by more than the standard
+    error of the paired difference.
+
+    :param totalSkill: total of the six skills
+    :param startAm: starting AM
+    :param skills: list of primary, secondary, other 1-4 skills to start the search from; None for an even split
+    :param objective: which estimate to maximize: 0 for average, 1 for safe, 2 for safer
+    :param numSims: number of voyages to simulate for each lineup; None for exact estimates, which are faster and
+                    don't add noise to the search
+    :param seed: seed for the random number generator, with numSims; None to seed from the OS
+    :param startStep: skill points moved by the first steps
+    :param minStep: smallest step to try
+    :param numResamples: number of bootstrap resamples for the standard error of a move, with numSims
+    :param debug: True to print the search progress
+    :return: tuple of (skills, estimates): the list of primary, secondary, other 1-4 skills found, and their tuple of
+             average, safe, safer estimated voyage durations in hours
+    """
 
-        def reset(self):
-            self.__pairs = self.__starting_state.copy()
+    def canonical(lineup):
+        return tuple(lineup[:2]) + tuple(sorted(lineup[2:], reverse=True))
+
+    estimates = {}
+    tieBreaks = {}
+    rng = np.random.default_rng(seed)
+
+    def estimate_exact(lineups):
+        missing = list({lineup for lineup in lineups if lineup not in estimates})
+        if len(missing) > 0:
+            results, survivalCurves = voyage_estimator_exact_batch(missing, startAm, survival=True)
+            estimates.update(zip(missing, map(tuple, results.tolist())))
+            # estimates only change a tick at a time, so ties are broken on the mean duration
+            tieBreaks.update(zip(missing, survivalCurves.sum(axis=1).tolist()))
+        return [(estimates[lineup][objective], tieBreaks[lineup]) for lineup in lineups]
+
+    def simulate_paired(lineups):
+        skillMins, skillMaxs = _skill_bounds(lineups)
+        return _simulate_out_ticks(skillMins, skillMaxs, np.full(len(lineups), startAm, dtype=np.int64), numSims, rng,
+                                   paired=True)
+
+    def best_move(best, candidates):
+        """
+        :return: tuple of the index of the best candidate, and its estimates if it improves on best, else None
+        """
+        if numSims is None:
+            values = estimate_exact([best] + candidates)
+            iBest = max(range(len(candidates)), key=lambda i: values[i + 1])
+            return iBest, (estimates[candidates[iBest]] if values[iBest + 1] > values[0] else None)
+
+        iBest = np.argmax(_out_tick_quantiles(simulate_paired([best] + candidates))[1:, objective]).item()
+        outTicks = simulate_paired([best, candidates[iBest]])
+        difference = np.diff(_out_tick_quantiles(outTicks)[:, objective]).item()
+        standardError = _paired_resampled_differences(outTicks, numResamples, rng)[1, :, objective].std()
+        return iBest, (tuple(_out_tick_quantiles(outTicks)[1].tolist()) if difference > standardError else None)
+
+    if skills is None:
+        skills = [totalSkill // 6] * 6
+        skills[0] += totalSkill - sum(skills)
+    assert sum(skills) == totalSkill and min(skills) > 0, skills
+    best = canonical(skills)
+    lastMove = None
+    step = startStep
+    numSteps = 0
+    while step >= minStep:
+        candidates = []
+        for iTo in range(6):
+            for iFrom in range(6):
+                if iTo != iFrom and best[iFrom] > step:
+                    lineup = list(best)
+                    lineup[iTo] += step
+                    lineup[iFrom] -= step
+                    candidates.append(canonical(lineup))
+        if lastMove is not None:
+            lineup = [skill + move for skill, move in zip(best, lastMove)]
+            if min(lineup) > 0:
+                candidates.append(canonical(lineup))
+
+        iBest, improvement = best_move(best, candidates)
+        numSteps += 1
+        if improvement is not None:
+            lastMove = [new - old for new, old in zip(candidates[iBest], best)]
+            best = candidates[iBest]
+            if debug:
+                print(f'{numSteps:4d} step {step}: {list(best)} {time_format(improvement[0])}')
+        else:
+            lastMove = None
+            step //= 2
 
-        def remove(self, pair):
-            self.__pairs.remove(pair)
+    if debug:
+        print(f'{numSteps} steps' + (f', {len(estimates)} lineups estimated' if numSims is None else ''))
+    if numSims is None:
+        return list(best), estimates[best]
+    return list(best), tuple(_out_tick_quantiles(simulate_paired([best]))[0].tolist())
 
-    skills = [7333] * 6
-    startAm = 2700
 
-    maxRounds = 100
-    startIncrement = 1000
-    incrementFactor = 10
-    increment = startIncrement
-    swaps = Swaps()
-    lastEstimate, lastSafeEstimate, lastSaferEstimate = voyage_estimator_simple(*skills, startAm)
-    for iRound in range(maxRounds):
-        while len(swaps) > 0:
-            pair = swaps.pop()
-            if skills[pair[1]] < increment:
-                continue
-            skills[pair[0]] += increment
-            skills[pair[1]] -= increment
+def dilemma_chances(survivalCurve):
+    """
+    :param survivalCurve: array of the chance that the voyage is still running after each tick, e.g. from
+                          voyage_estimator_exact or voyage_estimator_numpy with survival=True
+    :return: dict of the chance of reaching each dilemma that any voyage reaches, keyed by the dilemma's hour
+    """
+    dilemmaTicks = np.arange(TICKS_PER_DILEMMA, survivalCurve.size + 1, TICKS_PER_DILEMMA)
+    # a voyage reaches the dilemma at tick t if it's still running after tick t - 1
+    return {int(tick // TICKS_PER_HOUR): survivalCurve[tick - 1].item() for tick in dilemmaTicks
+            if survivalCurve[tick - 1] > 0}
 
-            estimate, safeEstimate, saferEstimate = voyage_estimator_simple(*skills, startAm)
-            diff = estimate - lastEstimate
-            print("{:4d} {:0.3f} {:0.3f} {:0.3f}".format(iRound, estimate, safeEstimate, saferEstimate), skills,
-                  "change of {:0.3f}".format(diff), "{} swaps left".format(len(swaps)))
 
-            if diff > 0:
-                lastEstimate, lastSafeEstimate, lastSaferEstimate = estimate, safeEstimate, saferEstimate
-                swaps.reset()
-                break
-            else:
-                estimate, safeEstimate, saferEstimate = lastEstimate, lastSafeEstimate, lastSaferEstimate
-                skills[pair[0]] -= increment
-                skills[pair[1]] += increment
+def _last_dilemma_chance(results):
+    """
+    :param results: TickHistogram of simulated voyages
+    :return: tuple of the last dilemma any voyage reached (as a count of dilemmas) and the percent chance of reaching it
+    """
+    lastDilemma = results.max_tick() // TICKS_PER_DILEMMA
+    lastDilemmaFails = results.counts[:lastDilemma * TICKS_PER_DILEMMA].sum()
 
-#            if increment == 1 or increment == int(increment/incrementFactor):
-#                print('Done!')
-#                break
-#            print('Reducing increment from {} to {}'.format(increment, increment/incrementFactor))
-#            increment = int(increment/incrementFactor)
-        swaps.reset()
+    dilChance = round(100 * (len(results) - lastDilemmaFails) / len(results))
+    # HACK: if there is a tiny chance of the next dilemma, assume 100% chance of the previous one instead
+    if dilChance == 0:
+        lastDilemma -= 1
+        dilChance = 100
+    return lastDilemma, dilChance
 
 
 class VoyageResult:
@@ -263,6 +1386,7 @@ class VoyageResult:
         self.lastDil = None
         self.dilChance = None
         self.refillCostResult = None
+        self.dilemmaChances = None
 
     def __str__(self):
         # Estimated voyage length of {TimeFormat(extendResults[0].result)}
@@ -491,6 +1615,222 @@ def voyage_calculator2(ps, ss, o1, o2, o3, o4, startAm, numExtends=2, currentAm=
     return voyageResults, n20hrdil, n20hrrefills
 
 
+def _simulate_resumed_out_ticks(skillMins, skillMaxs, startTicks, startAms, rng):
+    """
+    Like _simulate_out_ticks for a single lineup, except that each voyage picks up from its own tick with its own AM,
+    as after a refill or when checking on a voyage that's already running.  A voyage with a start tick inside the
+    rolled hazards joins the simulation at the first rolled hazard after its start tick.
+
+    :param skillMins: (1, 6) array of the lowest skill rolls of the lineup
+    :param skillMaxs: (1, 6) array of the highest skill rolls of the lineup
+    :param startTicks: array of the tick each voyage has reached; it plays out from the tick after
+    :param startAms: array of the AM of each voyage at its start tick
+    :param rng: NumPy random Generator
+    :return: array of the ticks at which the voyages ran out of AM; MAX_TICKS for any still going at MAX_TICKS
+    """
+    rollTicks, amDrift = _tick_schedule(skillMins, skillMaxs)
+    outTicks = np.full(startTicks.size, MAX_TICKS, dtype=np.int64)
+    # AM at a tick is base + amDrift[tick] plus the AM won or lost on rolled hazards since the start tick
+    base = startAms - amDrift[startTicks]
+
+    # Voyages that start before the first rolled hazard play out the same way until it, but AM can go up as well as
+    # down in that stretch, so search the running minimum of the AM drift from each distinct start tick
+    firstRollTick = rollTicks[0] if rollTicks.size > 0 else MAX_TICKS + 1
+    beforeRolls = startTicks < firstRollTick
+    for startTick in np.unique(startTicks[beforeRolls]):
+        sims = np.flatnonzero(beforeRolls & (startTicks == startTick))
+        minDrift = np.minimum.accumulate(amDrift[startTick + 1:firstRollTick])
+        outIndexes = np.searchsorted(-minDrift, base[sims])
+        outOfAm = outIndexes < minDrift.size
+        outTicks[sims[outOfAm]] = startTick + 1 + outIndexes[outOfAm]
+        beforeRolls[sims[outOfAm]] = False
+
+    # The rest join the simulation after the last rolled hazard at or before their start tick.  AM only goes down
+    # between rolls, so the span search never finds a tick before a voyage's start tick, where AM was still positive.
+    joinRolls = np.searchsorted(rollTicks, startTicks, side='right') - 1
+    joinOrder = np.flatnonzero(startTicks >= firstRollTick)
+    joinOrder = joinOrder[np.argsort(joinRolls[joinOrder], kind='stable')]
+    joinBounds = np.searchsorted(joinRolls[joinOrder], np.arange(rollTicks.size + 1))
+
+    simIds = np.flatnonzero(beforeRolls)
+    am = base[simIds]
+    if rollTicks.size == 0:
+        return outTicks
+    rollNeeded = _roll_needed((rollTicks * HAZ_SKILL_PER_TICK).astype(np.int64)[:, np.newaxis], skillMins[0],
+                              skillMaxs[0])[:, SKILL_PICK_TABLE]
+    iFirstRoll = 0 if simIds.size > 0 else joinRolls[joinOrder].min(initial=rollTicks.size)
+    for iRoll in range(iFirstRoll, rollTicks.size):
+        if am.size == 0 and joinBounds[iRoll] == joinOrder.size:
+            break
+        tick = rollTicks[iRoll]
+        skillPickRoll, skillRoll = rng.random((2, am.size))
+        passed = skillRoll >= rollNeeded[iRoll][(skillPickRoll * SKILL_PICK_BINS).astype(np.intp)]
+        am += np.where(passed, HAZ_AM_PASS, -HAZ_AM_FAIL)
+
+        joiners = joinOrder[joinBounds[iRoll]:joinBounds[iRoll + 1]]
+        if joiners.size > 0:
+            simIds = np.concatenate([simIds, joiners])
+            am = np.concatenate([am, base[joiners]])
+
+        spanEnd = rollTicks[iRoll + 1] if iRoll + 1 < rollTicks.size else MAX_TICKS + 1
+        outOfAm = am + amDrift[spanEnd - 1] <= 0
+        if outOfAm.any():
+            outTicks[simIds[outOfAm]] = tick + np.searchsorted(-amDrift[tick:spanEnd], am[outOfAm])
+            stillRunning = ~outOfAm
+            simIds = simIds[stillRunning]
+            am = am[stillRunning]
+
+    return outTicks
+
+
+def _simulate_extends(skillMins, skillMaxs, startAm, startTick, currentAm, numExtends, numSims, rng):
+    """
+    Simulates numSims voyages of one lineup through refills.  Each voyage starts from currentAm at startTick, and is
+    refilled to startAm each time its AM runs out.  Every voyage plays out at least numExtends refills, and keeps
+    going until it's refilled past 20 hours, for the 20 hour statistics.
+
+    :return: tuple of (results, refillCosts, n20hrCosts, n20hrRefills): a TickHistogram of the out-of-AM ticks for
+             each extend, an array of the total dil spent on refills before each extend, and arrays of the dil spent
+             and refills made by each voyage to get past 20 hours
+    """
+    results = [TickHistogram() for _ in range(numExtends + 1)]
+    refillCosts = np.zeros(numExtends + 1, dtype=np.int64)
+    n20hrCosts = np.zeros(numSims, dtype=np.int64)
+    n20hrRefills = np.zeros(numSims, dtype=np.int64)
+
+    simIds = np.arange(numSims)
+    ticks = np.full(numSims, startTick, dtype=np.int64)
+    ams = np.full(numSims, currentAm, dtype=np.int64)
+    refillCostTotals = np.zeros(numSims, dtype=np.int64)
+    past20hrs = np.zeros(numSims, dtype=bool)
+    for extend in range(MAX_EXTENDS):
+        ticks = _simulate_resumed_out_ticks(skillMins, skillMaxs, ticks, ams, rng)
+        if extend <= numExtends:
+            results[extend].add(ticks)
+            refillCosts[extend] = refillCostTotals.sum()
+
+        # the refill dil cost goes up with the length of the voyage so far
+        voyTimes = ticks / TICKS_PER_HOUR
+        refillCostTotals += np.ceil(voyTimes * 60 / DIL_PER_MINUTE).astype(np.int64)
+        now20hrs = ~past20hrs & (voyTimes > 20)
+        n20hrCosts[simIds[now20hrs]] = refillCostTotals[now20hrs]
+        n20hrRefills[simIds[now20hrs]] = extend + 1
+        past20hrs |= now20hrs
+
+        stillGoing = ~(past20hrs & (extend >= numExtends)) & (ticks < MAX_TICKS)
+        simIds = simIds[stillGoing]
+        ticks = ticks[stillGoing]
+        ams = np.full(simIds.size, startAm, dtype=np.int64)
+        refillCostTotals = refillCostTotals[stillGoing]
+        past20hrs = past20hrs[stillGoing]
+        if simIds.size == 0:
+            break
+
+    return results, refillCosts, n20hrCosts, n20hrRefills
+
+
+def voyage_calculator_numpy(ps, ss, o1, o2, o3, o4, startAm, numExtends=2, currentAm=0, elapsedHours=0, *,
+                            numSims=5000, seed=None):
+    """
+    Vectorized version of voyage_calculator2: every simulated voyage is refilled in parallel as NumPy arrays (see
+    _simulate_resumed_out_ticks), and the results of each extend are kept separately.  The hazard rules and
+    percentile picks are the same as voyage_estimator_numpy.
+
+    Unlike voyage_calculator2, the 20 hour statistics are averaged over every simulated voyage rather than the first
+    100, and voyages that get past 20 hours still play out all numExtends refills.
+
+    :param ps: Primary skill total
+    :param ss: Secondary skill total
+    :param o1: Other skill 1 total
+    :param o2: Other skill 2 total
+    :param o3: Other skill 3 total
+    :param o4: Other skill 4 total
+    :param startAm: Starting AM (antimatter), and the AM after each refill
+    :param numExtends: Number of voyage extends (refills) to calculate
+    :param currentAm: Current AM (antimatter); 0 for a voyage that hasn't started
+    :param elapsedHours: Elapsed time in the voyage so far
+    :param numSims: number of voyages to simulate
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: tuple of (VoyageResults[], n20hrdil, n20hrrefills)
+    """
+
+    if min(ps, ss, o1, o2, o3, o4, startAm) <= 0:
+        raise Exception('invalid parameters')
+
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    startTick = math.floor(elapsedHours * TICKS_PER_HOUR)
+    results, refillCosts, n20hrCosts, n20hrRefills = _simulate_extends(
+        skillMins, skillMaxs, startAm, startTick, currentAm if currentAm > 0 else startAm, numExtends, numSims,
+        np.random.default_rng(seed))
+
+    voyageResults = []
+    for extend in range(numExtends + 1):
+        lastDilemma, dilChance = _last_dilemma_chance(results[extend])
+
+        extendResult = VoyageResult()
+        extendResult.result, extendResult.safeResult, extendResult.saferResult = results[extend].quantiles()
+        extendResult.lastDil = lastDilemma * HOURS_PER_DILEMMA
+        extendResult.dilChance = dilChance
+        extendResult.dilemmaChances = dilemma_chances(results[extend].survival())
+        extendResult.refillCostResult = math.ceil(refillCosts[extend] / numSims) if extend > 0 else 0
+        voyageResults.append(extendResult)
+
+    n20hrdil = math.ceil(n20hrCosts.mean())
+    n20hrrefills = round(n20hrRefills.mean())
+
+    return voyageResults, n20hrdil, n20hrrefills
+
+
+def voyage_estimator_resume(ps, ss, o1, o2, o3, o4, currentAm, elapsedHours, *, debug=False, numSims=5000,
+                            seed=None):
+    """
+    Estimates how a voyage that's already running will turn out, from its current AM and the time it's been going.
+    Only the rest of the voyage is simulated (see _simulate_resumed_out_ticks), so rechecking a voyage near its end
+    costs less than estimating it from the start.
+
+    :param ps: primary skill
+    :param ss: secondary skill
+    :param o1: other skill 1
+    :param o2: other skill 2
+    :param o3: other skill 3
+    :param o4: other skill 4
+    :param currentAm: current AM (antimatter)
+    :param elapsedHours: elapsed time in the voyage so far
+    :param debug: True to print additional information during execution.
+    :param numSims: number of voyages to simulate
+    :param seed: seed for the random number generator; None to seed from the OS
+    :return: VoyageResult with the average, safe, safer estimated total voyage durations in hours, the chance of
+             reaching the last dilemma and the chance of reaching each dilemma
+    """
+
+    if min(ps, ss, o1, o2, o3, o4, currentAm) <= 0 or elapsedHours < 0:
+        raise Exception('invalid parameters')
+
+    if elapsedHours > MAX_TICKS / TICKS_PER_HOUR:
+        raise ValueError(f'elapsedHours {elapsedHours} is past the longest voyage simulated, '
+                         f'{MAX_TICKS / TICKS_PER_HOUR:.1f} hours')
+
+    skillMins, skillMaxs = _skill_bounds([[ps, ss, o1, o2, o3, o4]])
+    startTick = math.floor(elapsedHours * TICKS_PER_HOUR)
+    rng = np.random.default_rng(seed)
+    results = TickHistogram()
+    for iStart in range(0, numSims, BATCH_CHUNK_SIMS):
+        blockSims = min(BATCH_CHUNK_SIMS, numSims - iStart)
+        results.add(_simulate_resumed_out_ticks(skillMins, skillMaxs, np.full(blockSims, startTick),
+                                                np.full(blockSims, currentAm), rng))
+    if debug:
+        print(f'{numSims} results from {results.min_tick() / TICKS_PER_HOUR} to '
+              f'{results.max_tick() / TICKS_PER_HOUR}')
+
+    lastDilemma, dilChance = _last_dilemma_chance(results)
+    voyageResult = VoyageResult()
+    voyageResult.result, voyageResult.safeResult, voyageResult.saferResult = results.quantiles()
+    voyageResult.lastDil = lastDilemma * HOURS_PER_DILEMMA
+    voyageResult.dilChance = dilChance
+    voyageResult.dilemmaChances = dilemma_chances(results.survival())
+    return voyageResult
+
+
 def voyage_calculator_cs(ps, ss, o1, o2, o3, o4, startAm, elapsedHours=0):
 
     numSims = 5000
@@ -552,7 +1892,7 @@ def voyage_calculator_cs(ps, ss, o1, o2, o3, o4, startAm, elapsedHours=0):
         resultsRefillCostTotal.Add(0)
     '''
     # results = [[0 for i in range(numSims+1)] for j in range(numExtends+1)]
-    results = [[0] * (numSims+1)] * (numExtends+1)
+    results = [TickHistogram() for _ in range(numExtends+1)]
     # resultsRefillCostTotal = [0 for i in range(numExtends+1)]
     resultsRefillCostTotal = [0] * (numExtends+1)
 
@@ -622,7 +1962,7 @@ def voyage_calculator_cs(ps, ss, o1, o2, o3, o4, startAm, elapsedHours=0):
                 refillCost = math.ceil(voyTime * 60 / dilPerMin)
 
                 if extend <= numExtends:
-                    results[extend][iSim] = tick / ticksPerHour
+                    results[extend].add_tick(tick)
                     if extend > 0:
                         resultsRefillCostTotal[extend] += refillCostTotal
 
@@ -642,29 +1982,11 @@ def voyage_calculator_cs(ps, ss, o1, o2, o3, o4, startAm, elapsedHours=0):
     extendResults = []
     for extend in range(numExtends+1):
         exResults = results[extend]
+        # as in the C# code, there are numSims+1 results per extend, zero for the sims that never got that far
+        exResults.add_tick(0, numSims + 1 - len(exResults))
 
-        exResults.sort()
-        voyTime = exResults[math.floor(len(exResults) / 2)]
-
-        # compute other results
-        safeTime = exResults[math.floor((len(exResults) / 10))]
-        saferTime = exResults[math.floor((len(exResults) / 100))]
-        # safestTime = exResults[0]
-
-        # compute last dilemma chance
-        lastDilemma = 0
-        lastDilemmaFails = 0
-        for i in range(len(exResults)):
-            dilemma = math.floor(exResults[i] / hoursBetweenDilemmas)
-            if dilemma > lastDilemma:
-                lastDilemma = dilemma
-                lastDilemmaFails = max(0, i)
-
-        dilChance = round((100 * (len(exResults) - lastDilemmaFails) / len(exResults)))
-        # HACK: if there is a tiny chance of the next dilemma, assume 100% chance of the previous one instead
-        if dilChance == 0:
-            lastDilemma -= 1
-            dilChance = 100
+        voyTime, safeTime, saferTime = exResults.quantiles()
+        lastDilemma, dilChance = _last_dilemma_chance(exResults)
 
         extendResult = VoyageResult()
         extendResult.result = voyTime
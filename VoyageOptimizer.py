@@ -1,5 +1,9 @@
 import GameData
-from VoyageEstimator import voyage_estimator_redux as voyage_estimator, time_format
+import VoyageCache
+from VoyageBackends import get_backend
+from VoyageEstimator import voyage_estimator_batch, voyage_comparison, voyage_screen, voyage_race, time_format
+import time
+import numpy as np
 import pandas as pd
 
 PS_ODDS = 0.35
@@ -35,6 +39,9 @@ SEAT_LIST_ORDERED = [CMD_SEAT1, CMD_SEAT2, DIP_SEAT1, DIP_SEAT2, SEC_SEAT1, SEC_
 SKILL_SEAT_MAP = {SCI_COL: [SCI_SEAT1, SCI_SEAT2], ENG_COL: [ENG_SEAT1, ENG_SEAT2], CMD_COL: [CMD_SEAT1, CMD_SEAT2],
                   MED_COL: [MED_SEAT1, MED_SEAT2], DIP_COL: [DIP_SEAT1, DIP_SEAT2], SEC_COL: [SEC_SEAT1, SEC_SEAT2]}
 SKILL_LIST = SKILL_SEAT_MAP.keys()
+SKILL_INDEX = {skill: index for index, skill in enumerate(SKILL_LIST)}
+SEAT_ORDER = list(SEAT_LIST)
+SEAT_INDEX = {seat: index for index, seat in enumerate(SEAT_ORDER)}
 
 CREW_ID_COL = 'crew_id'
 VOYTOTAL_COL = 'voytotal'
@@ -42,6 +49,82 @@ VOYTOTAL_WEIGHTED_COL = 'voytotal_w'
 PRISEC_COL = 'prisec'
 SKILLMAX_COL = 'skillmax'
 SCORE_COL = 'score'
+EXACT_COL = 'exact'
+
+
+def skill_weights(primary, secondary):
+    '''
+
+    :param primary: primary skill
+    :param secondary: secondary skill
+    :return: array of the weight of each skill in SKILL_LIST order in the adjusted voyage score
+    '''
+    weights = np.ones(len(SKILL_LIST))
+    weights[SKILL_INDEX[primary]] = PS_OS_RATIO
+    weights[SKILL_INDEX[secondary]] = SS_OS_RATIO
+    return weights
+
+
+class CrewIndex:
+    '''
+    The crew's skills as a NumPy int matrix, one row per crew in SKILL_LIST order, with a crew_id to row lookup.  It's
+    a copy, so it isn't affected by later changes to the DataFrame's order.
+    '''
+
+    def __init__(self, voyageDF):
+        assert type(voyageDF) is pd.DataFrame, type(voyageDF)
+
+        self.crew_ids = voyageDF[CREW_ID_COL].to_numpy()
+        self.names = voyageDF['name'].to_numpy()
+        self.skills = voyageDF[list(SKILL_LIST)].to_numpy(dtype=np.int64)
+        self.rows = {crew_id: row for row, crew_id in enumerate(self.crew_ids.tolist())}
+        self.__id_order = np.argsort(self.crew_ids, kind='stable')
+        # crew rows by each skill, highest first, and a bitmask per crew of the skills it can sit for
+        self.skill_rankings = {skill: CrewIndex.ranking(self.skills[:, index]) for skill, index in SKILL_INDEX.items()}
+        self.skill_masks = ((self.skills > 0) << np.arange(len(SKILL_LIST))).sum(axis=1)
+
+    def __len__(self):
+        return len(self.crew_ids)
+
+    @staticmethod
+    def ranking(values):
+        '''
+
+        :param values: array of a value per crew row
+        :return: array of the crew rows by value, highest first, ties in row order
+        '''
+        return np.argsort(-values, kind='stable')
+
+    def pick(self, ranking, count, *, skill=None, used=None):
+        '''
+        Walk a ranking for the first crew that can sit for a skill and aren't used yet.
+
+        :param ranking: array of crew rows, e.g. from skill_rankings
+        :param count: number of crew to pick
+        :param skill: skill the crew must have; None for any crew
+        :param used: bool array of the crew rows to skip, e.g. Seats.assigned_rows; None to skip none
+        :return: list of the picked crew rows, in ranking order
+        '''
+        skill_bit = 1 << SKILL_INDEX[skill] if skill is not None else 0
+        picked = []
+        for row in ranking:
+            if self.skill_masks[row] & skill_bit == skill_bit and (used is None or not used[row]):
+                picked.append(row.item())
+                if len(picked) == count:
+                    break
+        return picked
+
+    def rows_of(self, crew_ids):
+        '''
+
+        :param crew_ids: array-like of crew_ids
+        :return: array of the row of each crew
+        '''
+        crew_ids = np.asarray(crew_ids)
+        rows = self.__id_order[np.searchsorted(self.crew_ids, crew_ids, sorter=self.__id_order)
+                               .clip(max=len(self) - 1)]
+        assert (self.crew_ids[rows] == crew_ids).all(), 'unknown crew_id'
+        return rows
 
 
 class Seats:
@@ -63,7 +146,7 @@ class Seats:
         pri = skill_totals[primary]
         sec = skill_totals[secondary]
         others = ' '.join([str(value) if index != primary and index != secondary else ''
-                           for index, value in skill_totals.iteritems()])
+                           for index, value in skill_totals.items()])
         others = ' '.join(others.split())       # remove any multiple consecutive spaces
         return f'-d voytime {pri} {sec} {others} {am}'
 
@@ -71,7 +154,7 @@ class Seats:
     def pretty_skill_totals_static(skill_totals, *, primary=None, secondary=None, voy_score=None):
         if voy_score is None and primary is not None and secondary is not None:
             voy_score = Seats.__calc_voy_score(skill_totals, primary, secondary)
-        pairs = [f'{index}: {value:5}' for index, value in skill_totals.iteritems()]
+        pairs = [f'{index}: {value:5}' for index, value in skill_totals.items()]
         return ', '.join(pairs) + (f', adj. score: {voy_score}' if voy_score is not None else '')
 
     def pretty_skill_totals_for_bot(self, primary, secondary, am):
@@ -80,174 +163,303 @@ class Seats:
     def pretty_skill_totals(self):
         return Seats.pretty_skill_totals_static(self.skill_totals, voy_score=self.adj_voy_score)
 
-    def __get_df_val(self, crew_id, col):
-        return self.__df[self.__df[CREW_ID_COL] == crew_id].iloc[0][col]
-
-    def __get_df_skills(self, crew_id):
-        cols = list(self.__df.columns)
-        cols.remove('traits')
-        return self.__df[self.__df[CREW_ID_COL] == crew_id].iloc[0][SKILL_LIST]
-
-    def __update_voy_score(self):
-        self.adj_voy_score = Seats.__calc_voy_score(self.skill_totals, self.ps, self.ss)
-        return self.adj_voy_score
+    def __get_crew_skills(self, row):
+        return pd.Series(self.__crew.skills[row], index=list(SKILL_LIST))
 
-    def __init__(self, voyageDF, primary, secondary):
-        assert type(voyageDF) is pd.DataFrame, type(voyageDF)
+    def __init__(self, voyageDF, primary, secondary, *, crew_index=None):
+        '''
 
-        self.seats = {seat: None for seat in SEAT_LIST}
-        self.__df = voyageDF
-        self.skill_totals = pd.Series({skill: 0 for skill in SKILL_LIST})
+        :param voyageDF: the crew DataFrame
+        :param primary: primary skill
+        :param secondary: secondary skill
+        :param crew_index: CrewIndex of voyageDF, to share one between many Seats; None to build one
+        '''
+        self.__crew = crew_index if crew_index is not None else CrewIndex(voyageDF)
+        # crew row in each seat, in SEAT_LIST order, and the seat each crew row is in; -1 for none
+        self.__seat_rows = np.full(len(SEAT_LIST), -1, dtype=np.int64)
+        self.__crew_seats = np.full(len(self.__crew), -1, dtype=np.int64)
+        self.totals = np.zeros(len(SKILL_LIST), dtype=np.int64)
         self.ps = primary
         self.ss = secondary
-        self.adj_voy_score = 0
+        self.__weights = skill_weights(primary, secondary)
 
     def __str__(self):
         max_len = max([len(seat) for seat in SEAT_LIST])
         s = ''
         for seat in SEAT_LIST_ORDERED:
-            if self.seats[seat] is not None:
-                name = self.__get_df_val(self.seats[seat], 'name')
-            else:
-                name = 'None'
+            row = self.__seat_rows[SEAT_INDEX[seat]]
+            name = self.__crew.names[row] if row >= 0 else 'None'
             s += f'{seat:{max_len}}: {name}\n'
         return s
 
+    @property
+    def seats(self):
+        '''
+
+        :return: dict of the crew_id in each seat, or None for an empty seat
+        '''
+        return {seat: self.__crew.crew_ids[row].item() if row >= 0 else None
+                for seat, row in zip(SEAT_LIST, self.__seat_rows.tolist())}
+
+    @property
+    def assigned_rows(self):
+        '''
+
+        :return: bool array of the crew rows that are in a seat
+        '''
+        return self.__crew_seats >= 0
+
+    @property
+    def skill_totals(self):
+        '''
+
+        :return: pandas Series of the skill totals, indexed by skill
+        '''
+        return pd.Series(self.totals, index=list(SKILL_LIST))
+
+    @property
+    def adj_voy_score(self):
+        '''
+
+        :return: the voyage score of the skill totals, weighted by how often each skill is picked
+        '''
+        return int(self.totals @ self.__weights)
+
+    def __unseat(self, seat_index, debug=False):
+        row = self.__seat_rows[seat_index]
+        if debug:
+            print(f'Removing {self.__crew.crew_ids[row]} from {SEAT_ORDER[seat_index]}')
+            print('Before: ', self.pretty_skill_totals())
+            print('Crew:   ', Seats.pretty_skill_totals_static(self.__get_crew_skills(row),
+                                                               primary=self.ps, secondary=self.ss))
+        self.totals -= self.__crew.skills[row]
+        self.__seat_rows[seat_index] = -1
+        self.__crew_seats[row] = -1
+        if debug:
+            print('After:  ', self.pretty_skill_totals())
+
     def assign(self, seat, crew_id, debug=False):
+        seat_index = SEAT_INDEX[seat]
+        row = self.__crew.rows[crew_id]
+
         # if another crew was in this seat, remove it and deduct skills
-        if self.seats[seat] is not None:
-            old_crew_id = self.seats[seat]
-            if debug:
-                print('Removing {} from {}', old_crew_id, seat)
-                print('Before: ', self.pretty_skill_totals())
-                print('Crew:   ', Seats.pretty_skill_totals_static(self.__get_df_skills(old_crew_id),
-                                                                   primary=self.ps, secondary=self.ss))
-            self.skill_totals -= self.__get_df_skills(old_crew_id)
-            if debug:
-                print('After:  ', self.pretty_skill_totals())
-
-        for s, c in self.seats.items():
-            if c == crew_id:
-                if debug:
-                    print(f'Removing {c} from {s}')
-                    print('Before: ', self.pretty_skill_totals())
-                    print('Crew:   ', Seats.pretty_skill_totals_static(self.__get_df_skills(self.seats[s]),
-                                                                       primary=self.ps, secondary=self.ss))
-                self.skill_totals -= self.__get_df_skills(self.seats[s])
-                if debug:
-                    print('After:  ', self.pretty_skill_totals())
-                self.seats[s] = None
-                break
+        if self.__seat_rows[seat_index] >= 0:
+            self.__unseat(seat_index, debug)
+
+        # if the crew was in another seat, move it from there
+        if self.__crew_seats[row] >= 0:
+            self.__unseat(self.__crew_seats[row], debug)
 
 #        print(f'Assigning {crew_id} to {seat}')
-        assert self.seats[seat] is None
-        self.seats[seat] = crew_id
+        self.__seat_rows[seat_index] = row
+        self.__crew_seats[row] = seat_index
         if debug:
             print('Before: ', self.pretty_skill_totals())
-            print('Crew:   ', Seats.pretty_skill_totals_static(self.__get_df_skills(crew_id),
+            print('Crew:   ', Seats.pretty_skill_totals_static(self.__get_crew_skills(row),
                                                                primary=self.ps, secondary=self.ss))
-        self.skill_totals += self.__get_df_skills(crew_id)
+        self.totals += self.__crew.skills[row]
         if debug:
             print('After:  ', self.pretty_skill_totals())
 
+    def swap_deltas(self, seat, crew_ids=None):
+        '''
+        Work out the skill totals and voyage scores if each of the given crew were assigned to the seat, as assign
+        would, without changing the seats: the crew in the seat is removed, and a crew already in another seat moves
+        from there.
+
+        :param seat: the seat to assign
+        :param crew_ids: array-like of the crew_ids of the crew to try; None for every crew
+        :return: tuple of a (k, 6) array of the resulting skill totals, in SKILL_LIST order, and an array of the
+                 resulting voyage scores, one per crew
+        '''
+        seat_index = SEAT_INDEX[seat]
+        rows = np.arange(len(self.__crew)) if crew_ids is None else self.__crew.rows_of(crew_ids)
+        skills = self.__crew.skills[rows]
+
+        base = self.totals.copy()
+        seated_row = self.__seat_rows[seat_index]
+        if seated_row >= 0:
+            base -= self.__crew.skills[seated_row]
+        # crew in another seat leave it, and the crew already in this seat contributes its skills back unchanged
+        elsewhere = (self.__crew_seats[rows] >= 0) & (self.__crew_seats[rows] != seat_index)
+        totals = base + skills * ~elsewhere[:, np.newaxis]
+        totals[rows == seated_row] = self.totals
+
+        return totals, (totals @ self.__weights).astype(np.int64)
+
     def is_crew_assigned(self, crew):
-        for k, v in self.seats.items():
-            if v == crew:
-                return True
+        return self.__crew_seats[self.__crew.rows[crew]] >= 0
 
-        return False
+
+class ExactSearch:
+
+    def __init__(self):
+        self.proven = None
+        self.time_limit = None
+        self.greedy_shortfalls = None
+        self.num_nodes = None
+        self.num_candidates = None
+        self.seconds = None
+
+    def __str__(self):
+        text = f'{self.num_nodes} nodes, {self.num_candidates} candidates in {self.seconds:0.2f}s'
+        if self.greedy_shortfalls is not None:
+            text += '\nGreedy shortfall: ' + ', '.join([f'{strategy} {shortfall}'
+                                                       for strategy, shortfall in self.greedy_shortfalls.items()])
+        if not self.proven:
+            text += f' (not proven optimal: search stopped after {self.time_limit}s)'
+        return text
 
 
 class Optimizer:
 
-    def __init__(self, game_data, primary, secondary, startAm):
+    def __init__(self, game_data, primary, secondary, startAm, *, cache=None, backend=None):
+        '''
+
+        :param game_data: GameData with the crew to pick from
+        :param primary: primary skill of the voyage
+        :param secondary: secondary skill of the voyage
+        :param startAm: starting AM
+        :param cache: VoyageCache for the estimates; None for the shared one
+        :param backend: name of the estimator backend for single estimates (see VoyageBackends); None for the fastest
+        '''
         self.crew_count = len(game_data.crew_data.crew)
         self.df = game_data.crew_data.voyDF
         self.primary = primary
         self.secondary = secondary
         self.startAm = startAm
-        self.__crew_scores_calculated = False
+        self.backend = backend
+        self.cache = cache if cache is not None else VoyageCache.get_default_cache()
+        self.crew_index = CrewIndex(self.df)
+        self.__crew_scores_cache = {}
+        self.__score_rankings = {}
+
+    def __estimator_skills(self, seats):
+        '''
+
+        :param seats: a Seats object
+        :return: list of the seats' skill totals in the order the estimators take them: primary, secondary, others
+        '''
+        totals = seats.totals.tolist()
+        others = [totals[index] for skill, index in SKILL_INDEX.items()
+                  if skill != self.primary and skill != self.secondary]
+        assert len(others) == 4, others
+
+        return [totals[SKILL_INDEX[self.primary]], totals[SKILL_INDEX[self.secondary]], *others]
 
     def __calc_duration(self, seats):
-        ps = None
-        ss = None
-        os = []
-        for skill in SKILL_LIST:
-            if skill == self.primary:
-                ps = seats.skill_totals[skill].item()
-            elif skill == self.secondary:
-                ss = seats.skill_totals[skill].item()
-            else:
-                os.append(seats.skill_totals[skill].item())
-        assert ps is not None
-        assert ss is not None
-        assert len(os) == 4, os
+        return self.cache.estimate(*self.__estimator_skills(seats), self.startAm,
+                                   estimator=get_backend(self.backend))
 
-        return voyage_estimator(ps, ss, *os, self.startAm)
+    def calc_durations(self, seats_list, *, numSims=5000):
+        '''
+        Estimate the durations of many lineups in one call.
 
-    def __calc_weighted_voytotal(self, crew_skills):
+        :param seats_list: list of Seats objects
+        :param numSims: number of voyages to simulate for each lineup
+        :return: (N, 3) array of average, safe, safer estimated voyage durations in hours, one row per Seats object
         '''
+        skill_matrix = [self.__estimator_skills(seats) for seats in seats_list]
+        return np.array(self.cache.estimate_batch(skill_matrix, self.startAm, batch_estimator=voyage_estimator_batch,
+                                                  numSims=numSims))
 
-        :param crew_skills: a row from the PlayerData DF, aka a pandas Series, with the crew's skills
-        :return: weighted voyage total for the crew member
+    def screen_durations(self, seats_list, *, keep_fraction=0.05, numSims=5000, validate=False):
+        '''
+        Estimate only the most promising of many lineups: the rest are thrown out by a closed-form screen before
+        simulating (see voyage_screen).
+
+        :param seats_list: list of Seats objects
+        :param keep_fraction: fraction of the lineups to simulate
+        :param numSims: number of voyages to simulate for each kept lineup
+        :param validate: True to also simulate the thrown out lineups, to report the screen's false-negative rate
+        :return: LineupScreen with the indices into seats_list of the kept lineups and their estimated durations
         '''
-        return int(sum([crew_skills[s] * PS_OS_RATIO if s == self.primary else
-                        crew_skills[s] * SS_OS_RATIO if s == self.secondary else
-                        crew_skills[s]
-                    for s in SKILL_LIST]))
+        skill_matrix = [self.__estimator_skills(seats) for seats in seats_list]
+        return voyage_screen(skill_matrix, self.startAm, keepFraction=keep_fraction, validate=validate,
+                             batchEstimator=lambda skills, ams: self.cache.estimate_batch(
+                                 skills, ams, batch_estimator=voyage_estimator_batch, numSims=numSims))
 
-    def __calc_prisec_sum(self, crew_skills):
+    def compare_durations(self, seats_list, *, numSims=1000, seed=None):
         '''
+        Compare lineups on the same simulated luck (see voyage_comparison), e.g. to rank the results of the
+        optimize_crew_*_strategy methods.  Comparisons aren't cached.
 
-        :param crew_skills: a row from the PlayerData DF, aka a pandas Series, with the crew's skills
-        :return: sum of primary + secondary skills for the crew member
+        :param seats_list: list of Seats objects
+        :param numSims: number of paired voyages to simulate
+        :param seed: seed for the random number generator; None to seed from the OS
+        :return: LineupComparison of the lineups against the first one
         '''
-        return int(sum([crew_skills[s] * PS_OS_RATIO if s == self.primary else
-                        crew_skills[s] * SS_OS_RATIO if s == self.secondary else
-                        0
-                    for s in SKILL_LIST]))
+        skill_matrix = [self.__estimator_skills(seats) for seats in seats_list]
+        return voyage_comparison(skill_matrix, self.startAm, numSims=numSims, seed=seed)
 
-    def __calc_scores(self):
+    def race_durations(self, seats_list, *, start_sims=250, sim_budget=None, seed=None):
         '''
-        Add columns to the DataFrame for each of the strategies.  Note that the SkillMax strategy uses the existing
-        skill columns, so there's no new column created for it.
+        Pick the best of many lineups, e.g. the results of the optimize_crew_*_strategy methods, by successive halving
+        (see voyage_race), spending most of the simulations on the lineups that are hardest to tell apart.  Races aren't
+        cached.
+
+        :param seats_list: list of Seats objects
+        :param start_sims: number of voyages to simulate for each lineup in the first round
+        :param sim_budget: most voyages to simulate in total; None for no limit
+        :param seed: seed for the random number generator; None to seed from the OS
+        :return: LineupRace with the index into seats_list of the winning lineup and the total number of sims spent
         '''
+        skill_matrix = [self.__estimator_skills(seats) for seats in seats_list]
+        return voyage_race(skill_matrix, self.startAm, startSims=start_sims, simBudget=sim_budget, seed=seed)
 
-        if self.__crew_scores_calculated:
-            return
-
-        # Simple voyage total strategy
-        self.df[VOYTOTAL_COL] = self.df[SKILL_LIST].apply(sum, axis=1)
+    def __crew_scores(self, primary, secondary):
+        '''
 
-        # Weighted voyage total strategy
-#        self.df[VOYTOTAL_WEIGHTED_COL] = self.df[SKILL_LIST].apply(lambda x: self.calc_weighted_voytotal(x), axis=1)
-        self.df[VOYTOTAL_WEIGHTED_COL] = self.df[SKILL_LIST].apply(self.__calc_weighted_voytotal, axis=1)
+        :param primary: primary skill
+        :param secondary: secondary skill
+        :return: dict of arrays of each crew's score for each of the strategies' score columns, in CrewIndex row order
+        '''
+        key = (primary, secondary)
+        if key not in self.__crew_scores_cache:
+            skills = self.crew_index.skills
+            weights = skill_weights(primary, secondary)
+            prisec_weights = weights.copy()
+            prisec_weights[[index for skill, index in SKILL_INDEX.items() if skill not in key]] = 0
+            self.__crew_scores_cache[key] = {VOYTOTAL_COL: skills.sum(axis=1),
+                                             VOYTOTAL_WEIGHTED_COL: (skills @ weights).astype(np.int64),
+                                             PRISEC_COL: (skills @ prisec_weights).astype(np.int64)}
+        return self.__crew_scores_cache[key]
+
+    def __score_ranking(self, col):
+        '''
 
-        # Primary/Secondary (prisec) skill strategy
-#        self.df[PRISEC_COL] = self.df[SKILL_LIST].apply(lambda x: self.calc_prisec_sum(x), axis=1)
-        self.df[PRISEC_COL] = self.df[SKILL_LIST].apply(self.__calc_prisec_sum, axis=1)
+        :param col: one of the strategies' score columns
+        :return: array of the crew rows by the column's score for the current primary and secondary, highest first
+        '''
+        key = (self.primary, self.secondary, col)
+        if key not in self.__score_rankings:
+            self.__score_rankings[key] = CrewIndex.ranking(self.__crew_scores(self.primary, self.secondary)[col])
+        return self.__score_rankings[key]
 
-        self.__crew_scores_calculated = True
+    def __assign_pair(self, seats, skill, ranking):
+        '''
+        Assign the two highest ranked crew that can sit for the skill and aren't seated yet to the skill's seats.
+        '''
+        for seat, row in zip(SKILL_SEAT_MAP[skill], self.crew_index.pick(ranking, 2, skill=skill,
+                                                                           used=seats.assigned_rows)):
+            seats.assign(seat, self.crew_index.crew_ids[row].item())
 
     def optimize_crew_skillmax_strategy(self):
         print(f'Optimizing {self.primary}/{self.secondary}/{self.startAm} voyage with {self.crew_count} '
               f'crew using SkillMax strategy...')
-        seats = Seats(self.df, self.primary, self.secondary)
-        self.__calc_scores()
+        seats = Seats(self.df, self.primary, self.secondary, crew_index=self.crew_index)
 
         # Pick the two crew with the highest voyage score in the seat's skill
         for skill in SKILL_SEAT_MAP:
-            self.df.sort_values(by=skill, ascending=False, inplace=True)
-            seats.assign(SKILL_SEAT_MAP[skill][0], self.df.iloc[0][CREW_ID_COL])
-            seats.assign(SKILL_SEAT_MAP[skill][1], self.df.iloc[1][CREW_ID_COL])
+            for seat, row in zip(SKILL_SEAT_MAP[skill], self.crew_index.pick(self.crew_index.skill_rankings[skill], 2)):
+                seats.assign(seat, self.crew_index.crew_ids[row].item())
 
         return seats, self.__calc_duration(seats)
 
     def optimize_crew_voytotal_strategy(self, use_weighted=False):
         print(f'Optimizing {self.primary}/{self.secondary}/{self.startAm} voyage with {self.crew_count} '
               f'crew using VoyTotal strategy...')
-        seats = Seats(self.df, self.primary, self.secondary)
-        self.__calc_scores()
+        seats = Seats(self.df, self.primary, self.secondary, crew_index=self.crew_index)
 
         if use_weighted:
             col_to_use = VOYTOTAL_WEIGHTED_COL
@@ -255,45 +467,163 @@ class Optimizer:
             col_to_use = VOYTOTAL_COL
 
         # Pick the two crew with the highest voyage score eligible to sit in each seat
-        self.df.sort_values(by=col_to_use, ascending=False, inplace=True)
+        ranking = self.__score_ranking(col_to_use)
         for skill in SKILL_SEAT_MAP:
-            used_crew = set(seats.seats.values()).difference({None})
-            tempDF = self.df[(self.df[skill] > 0) & (~ self.df[CREW_ID_COL].isin(used_crew))]
-            seats.assign(SKILL_SEAT_MAP[skill][0], tempDF.iloc[0][CREW_ID_COL])
-            seats.assign(SKILL_SEAT_MAP[skill][1], tempDF.iloc[1][CREW_ID_COL])
+            self.__assign_pair(seats, skill, ranking)
 
         return seats, self.__calc_duration(seats)
 
     def optimize_crew_prisec_strategy(self):
         print(f'Optimizing {self.primary}/{self.secondary}/{self.startAm} voyage with {self.crew_count} '
               f'crew using PriSec strategy...')
-        seats = Seats(self.df, self.primary, self.secondary)
-        self.__calc_scores()
+        seats = Seats(self.df, self.primary, self.secondary, crew_index=self.crew_index)
 
         # Pick the two crew with the highest pri+sec score eligible to sit in each seat, starting with NON-pri/sec seats
-        self.df.sort_values(by=PRISEC_COL, ascending=False, inplace=True)
+        ranking = self.__score_ranking(PRISEC_COL)
         for skill in SKILL_SEAT_MAP:
             # Do the other skill seats first
             if skill != self.primary and skill != self.secondary:
-                used_crew = set(seats.seats.values()).difference({None})
-                tempDF = self.df[(self.df[skill] > 0) & (~ self.df[CREW_ID_COL].isin(used_crew))]
-                seats.assign(SKILL_SEAT_MAP[skill][0], tempDF.iloc[0][CREW_ID_COL])
-                seats.assign(SKILL_SEAT_MAP[skill][1], tempDF.iloc[1][CREW_ID_COL])
-
-        # Then do the secondary skill seats
-        used_crew = set(seats.seats.values()).difference({None})
-        tempDF = self.df[(self.df[self.secondary] > 0) & (~ self.df[CREW_ID_COL].isin(used_crew))]
-        seats.assign(SKILL_SEAT_MAP[self.secondary][0], tempDF.iloc[0][CREW_ID_COL])
-        seats.assign(SKILL_SEAT_MAP[self.secondary][1], tempDF.iloc[1][CREW_ID_COL])
-
-        # Then do the primary skill seats
-        used_crew = set(seats.seats.values()).difference({None})
-        tempDF = self.df[(self.df[self.primary] > 0) & (~ self.df[CREW_ID_COL].isin(used_crew))]
-        seats.assign(SKILL_SEAT_MAP[self.primary][0], tempDF.iloc[0][CREW_ID_COL])
-        seats.assign(SKILL_SEAT_MAP[self.primary][1], tempDF.iloc[1][CREW_ID_COL])
+                self.__assign_pair(seats, skill, ranking)
+
+        # Then do the secondary skill seats, then the primary skill seats
+        self.__assign_pair(seats, self.secondary, ranking)
+        self.__assign_pair(seats, self.primary, ranking)
 
         return seats, self.__calc_duration(seats)
 
+    def optimize_crew_exact_strategy(self, objective=SCORE_COL, *, greedy_results=None, time_limit=30, debug=False):
+        '''
+        Find the lineup that maximizes the adjusted voyage score exactly.  The search is branch-and-bound over taking
+        or leaving each crew, highest score first, keeping the crew taken seatable in the 12 seats, and bounded by the
+        next best scores.  Crew outside the top 12 by score for every skill they have are dropped first, since a
+        crew's score doesn't depend on its seat, so one of those 12 would always be free to take their seat.
+
+        Only the score objective is supported: bounds on the estimated duration from per-skill top-k totals are too
+        loose to prove a lineup optimal in reasonable time, so to pick by duration, race the strategies' lineups
+        instead (see race_durations).
+
+        :param objective: SCORE_COL, the only objective supported
+        :param greedy_results: dict of the (Seats, durations) results of the greedy strategies by name, to start the
+                               search from the best of them and report how far short of the optimum each fell; None to
+                               run them here when debug is True, and otherwise to leave the shortfalls out
+        :param time_limit: seconds to search for before settling for the best lineup so far; None for no limit
+        :param debug: True to print the search statistics and the greedy strategies' shortfalls
+        :return: tuple of the Seats and their estimated durations, as for the other strategies, and an ExactSearch with
+                 whether the lineup was proven optimal and the greedy strategies' shortfalls
+        '''
+        if objective != SCORE_COL:
+            raise ValueError(f'the exact strategy can only maximize {SCORE_COL!r}, not {objective!r}; use '
+                             f'race_durations to pick lineups by duration')
+        if greedy_results is None and debug:
+            greedy_results = {SKILLMAX_COL: self.optimize_crew_skillmax_strategy(),
+                              VOYTOTAL_WEIGHTED_COL: self.optimize_crew_voytotal_strategy(use_weighted=True),
+                              VOYTOTAL_COL: self.optimize_crew_voytotal_strategy(use_weighted=False),
+                              PRISEC_COL: self.optimize_crew_prisec_strategy()}
+        print(f'Optimizing {self.primary}/{self.secondary}/{self.startAm} voyage with {self.crew_count} '
+              f'crew using Exact strategy...')
+        start = time.time()
+        crew = self.crew_index
+        weights = skill_weights(self.primary, self.secondary)
+        scores = (crew.skills @ weights).tolist()
+        num_seats = len(SEAT_LIST)
+
+        def value(totals):
+            return int(totals @ weights)
+
+        # candidates by score, highest first; only the top 12 by score for a skill can be needed for it
+        ranking = CrewIndex.ranking(crew.skills @ weights)
+        keep = np.zeros(len(crew), dtype=bool)
+        for index in range(len(SKILL_LIST)):
+            keep[[row for row in ranking.tolist() if crew.skills[row, index] > 0][:num_seats]] = True
+        candidates = [row for row in ranking.tolist() if keep[row] and crew.skills[row].any()]
+        candidate_skills = [[index for index in range(len(SKILL_LIST)) if crew.skills[row, index] > 0]
+                            for row in candidates]
+        seats_per_skill = num_seats // len(SKILL_LIST)
+
+        lineup = []
+        # the candidates seated for each skill
+        skill_seated = [[] for _ in SKILL_LIST]
+        greedy_seats = [seats for seats, _ in greedy_results.values()] if greedy_results is not None else []
+        best_value = max([value(seats.totals) for seats in greedy_seats], default=-1)
+        best_lineup = None
+        num_nodes = 0
+        timed_out = False
+
+        def seat(i, visited):
+            # find a seat for candidate i, moving seated crew to other skills if need be (an augmenting path)
+            for index in candidate_skills[i]:
+                if index in visited:
+                    continue
+                visited.add(index)
+                if len(skill_seated[index]) < seats_per_skill:
+                    skill_seated[index].append(i)
+                    return True
+                for other in list(skill_seated[index]):
+                    skill_seated[index].remove(other)
+                    if seat(other, visited):
+                        skill_seated[index].append(i)
+                        return True
+                    skill_seated[index].append(other)
+            return False
+
+        def search(i, score):
+            nonlocal best_value, best_lineup, num_nodes, timed_out
+            num_nodes += 1
+            num_left = num_seats - len(lineup)
+            if num_left == 0:
+                if score > best_value:
+                    best_value, best_lineup = score, lineup.copy()
+                return
+            if len(candidates) - i < num_left:
+                return
+
+            # the next best candidates, even if they can't all be seated
+            if score + sum(scores[row] for row in candidates[i:i + num_left]) <= best_value:
+                return
+            if time_limit is not None and time.time() - start > time_limit:
+                timed_out = True
+                return
+
+            row = candidates[i]
+            saved = [list(seated) for seated in skill_seated]
+            if seat(i, set()):
+                lineup.append(row)
+                search(i + 1, score + scores[row])
+                lineup.pop()
+                skill_seated[:] = saved
+            search(i + 1, score)
+
+        search(0, 0)
+
+        if best_lineup is None:
+            if len(greedy_seats) == 0:
+                raise ValueError(f'no lineup of the {self.crew_count} crew fills all {num_seats} seats')
+            # no lineup beats the best greedy one
+            seats = max(greedy_seats, key=lambda seats: value(seats.totals))
+        else:
+            # the search has moved on since, so seat the best lineup's crew again
+            skill_seated[:] = [[] for _ in SKILL_LIST]
+            for row in best_lineup:
+                seat(candidates.index(row), set())
+            seats = Seats(self.df, self.primary, self.secondary, crew_index=crew)
+            for skill, index in SKILL_INDEX.items():
+                for seat_name, i in zip(SKILL_SEAT_MAP[skill], skill_seated[index]):
+                    seats.assign(seat_name, crew.crew_ids[candidates[i]].item())
+
+        exact_search = ExactSearch()
+        exact_search.proven = not timed_out
+        exact_search.time_limit = time_limit
+        if greedy_results is not None:
+            exact_search.greedy_shortfalls = {strategy: value(seats.totals) - value(strategy_seats.totals)
+                                              for strategy, (strategy_seats, _) in greedy_results.items()}
+        exact_search.num_nodes = num_nodes
+        exact_search.num_candidates = len(candidates)
+        exact_search.seconds = time.time() - start
+        if debug:
+            print(exact_search)
+
+        return seats, self.__calc_duration(seats), exact_search
+
 
 if __name__ == "__main__":
     sample_config = ['sec', 'cmd', 2700]
@@ -304,6 +634,9 @@ if __name__ == "__main__":
                VOYTOTAL_WEIGHTED_COL: opt.optimize_crew_voytotal_strategy(use_weighted=True),
                VOYTOTAL_COL: opt.optimize_crew_voytotal_strategy(use_weighted=False),
                PRISEC_COL: opt.optimize_crew_prisec_strategy()}
+    exact_seats, exact_durations, exact_search = opt.optimize_crew_exact_strategy(greedy_results=dict(results))
+    results[EXACT_COL] = exact_seats, exact_durations
+    print(exact_search)
 
     for strategy, (seats, durations) in results.items():
         print()
@@ -312,3 +645,9 @@ if __name__ == "__main__":
         print(seats.pretty_skill_totals())
         print(seats.pretty_skill_totals_for_bot(*sample_config))
         print(', '.join([time_format(t) for t in durations]))
+
+    print()
+    print(opt.race_durations([seats for seats, _ in results.values()]))
+
+    print()
+    print(opt.cache)
@@ -0,0 +1,217 @@
+import math
+import time
+import numpy as np
+from VoyageEstimator import TICKS_PER_HOUR, DIL_PER_MINUTE, MAX_TICKS, TickHistogram, time_format, _skill_bounds, \
+    _exact_survival_curve, _simulate_resumed_out_ticks
+
+
+class RefillDecision:
+
+    def __init__(self):
+        self.hours = None
+        self.refill = None
+        self.cost = None
+        self.hit_chance = None
+        self.expected_dil = None
+
+    def __str__(self):
+        if not self.refill:
+            return f'Out of AM at {time_format(self.hours)}: recall ({self.hit_chance:.0%} chance to reach the target)'
+        return f'Out of AM at {time_format(self.hours)}: refill for {self.cost} dil ({self.hit_chance:.0%} chance ' \
+               f'to reach the target, {self.expected_dil:.0f} dil expected from here)'
+
+
+class RefillPlan:
+    '''
+    The refill policy worked out by RefillPlanner.plan: what to do each time the voyage runs out of AM, depending on
+    when it runs out and, with a dil budget, how much dil has been spent so far.
+    '''
+
+    def __init__(self, target_hours, dil_budget, grid_ticks, costs, refill, hit_chances, expected_dil):
+        self.target_hours = target_hours
+        self.dil_budget = dil_budget
+        self.hit_chance = hit_chances[0, -1].item()
+        self.expected_dil = expected_dil[0, -1].item()
+        self.__grid_ticks = grid_ticks
+        self.__costs = costs
+        self.__refill = refill
+        self.__hit_chances = hit_chances
+        self.__expected_dil = expected_dil
+
+    def __str__(self):
+        budget = f' with a budget of {self.dil_budget} dil' if self.dil_budget is not None else ''
+        return f'{self.hit_chance:.0%} chance to reach {time_format(self.target_hours)}{budget}, ' \
+               f'{self.expected_dil:.0f} dil expected'
+
+    def decide(self, hours, dil_spent=0):
+        '''
+
+        :param hours: voyage time at which the voyage ran out of AM
+        :param dil_spent: dil spent on refills so far
+        :return: RefillDecision for the voyage
+        '''
+        decision = RefillDecision()
+        decision.hours = hours
+        if hours >= self.target_hours:
+            decision.refill = False
+            decision.cost = 0
+            decision.hit_chance = 1.0
+            decision.expected_dil = 0.0
+            return decision
+
+        state = min(np.searchsorted(self.__grid_ticks, math.ceil(hours * TICKS_PER_HOUR)), self.__grid_ticks.size - 1)
+        decision.cost = self.__costs[state].item()
+        # without a budget, the tables only have the one column
+        budget = 0 if self.dil_budget is None else self.dil_budget - dil_spent
+        if self.dil_budget is not None and budget < decision.cost:
+            decision.refill = False
+            decision.hit_chance = 0.0
+            decision.expected_dil = 0.0
+            return decision
+        decision.refill = self.__refill[state, budget].item()
+        decision.hit_chance = self.__hit_chances[state, budget].item()
+        decision.expected_dil = self.__expected_dil[state, budget].item()
+        return decision
+
+    def decisions(self, dil_spent=0):
+        '''
+
+        :param dil_spent: dil spent on refills so far
+        :return: list of RefillDecisions for running out of AM at each point of the planning grid before the target
+        '''
+        return [self.decide(tick / TICKS_PER_HOUR, dil_spent) for tick in self.__grid_ticks[1:]
+                if tick < self.target_hours * TICKS_PER_HOUR]
+
+
+class RefillPlanner:
+    '''
+    Plans refills for one lineup.  Each time a voyage runs out of AM it can be refilled, at a dil cost that goes up with
+    the time the voyage has run, or recalled.  The planner works out which to do by dynamic programming over the
+    chances of running out of AM again at each later time, which come from one survival curve per refill time.
+
+    Refill times are rounded up to a grid of grid_minutes, so each curve is worked out once and reused by every plan.
+    '''
+
+    def __init__(self, ps, ss, o1, o2, o3, o4, start_am, *, grid_minutes=5, num_sims=None, seed=None):
+        '''
+
+        :param ps: primary skill
+        :param ss: secondary skill
+        :param o1: other skill 1
+        :param o2: other skill 2
+        :param o3: other skill 3
+        :param o4: other skill 4
+        :param start_am: starting AM, and the AM after each refill
+        :param grid_minutes: spacing of the refill times the curves are worked out for
+        :param num_sims: number of voyages to simulate for each curve; None for exact curves (see
+                         voyage_estimator_exact)
+        :param seed: seed for the random number generator, with num_sims; None to seed from the OS
+        '''
+        self.skill_mins, self.skill_maxs = _skill_bounds([ps, ss, o1, o2, o3, o4])
+        self.start_am = start_am
+        self.grid_ticks = int(grid_minutes * TICKS_PER_HOUR / 60)
+        self.num_sims = num_sims
+        self.__rng = np.random.default_rng(seed)
+        self.__curves = {}
+
+    def survival_curve(self, tick):
+        '''
+
+        :param tick: tick of the refill; 0 for the start of the voyage
+        :return: array of the chance that the voyage is still running after each tick, if refilled at the given tick
+        '''
+        if tick not in self.__curves:
+            if self.num_sims is None:
+                self.__curves[tick] = _exact_survival_curve(self.skill_mins, self.skill_maxs, self.start_am, tick)
+            else:
+                results = TickHistogram()
+                results.add(_simulate_resumed_out_ticks(self.skill_mins[np.newaxis], self.skill_maxs[np.newaxis],
+                                                        np.full(self.num_sims, tick),
+                                                        np.full(self.num_sims, self.start_am), self.__rng))
+                self.__curves[tick] = results.survival()
+        return self.__curves[tick]
+
+    def plan(self, target_hours=20, *, dil_budget=None, min_hit_chance=0.0, dil_per_hit=None):
+        '''
+        Work out the refill policy that gets the most out of the voyage: each time it runs out of AM, refill or recall,
+        whichever has the higher expected value from there, valuing reaching target_hours at dil_per_hit and each dil
+        spent at one.  Recalling is worth nothing and costs nothing.  A refill must also be affordable within the budget
+        and leave at least min_hit_chance of reaching the target.
+
+        Without dil_per_hit, reaching the target is worth any dil, so the policy gives the highest chance of reaching it
+        and, between equal chances, the least expected dil.
+
+        :param target_hours: voyage time to reach
+        :param dil_budget: most dil to spend on refills in total; None for no limit
+        :param min_hit_chance: lowest chance of reaching the target that's worth refilling for
+        :param dil_per_hit: dil that reaching the target is worth; None for no limit
+        :return: RefillPlan
+        '''
+        target_tick = math.ceil(target_hours * TICKS_PER_HOUR)
+        grid_ticks = np.arange(0, min(target_tick + self.grid_ticks, MAX_TICKS + 1), self.grid_ticks)
+        num_states = grid_ticks.size
+        # refill cost by voyage time, as in voyage_calculator2; the voyage starts for free
+        costs = np.ceil(grid_ticks / TICKS_PER_HOUR * 60 / DIL_PER_MINUTE).astype(np.int64)
+        costs[0] = 0
+
+        # transitions[i, j] is the chance that after a refill at grid tick i the voyage next runs out of AM at a time
+        # that rounds up to grid tick j, and hits[i] the chance that it runs past the target instead
+        transitions = np.zeros((num_states, num_states))
+        hits = np.zeros(num_states)
+        for state, tick in enumerate(grid_ticks):
+            curve = self.survival_curve(tick)
+            out_chances = -np.diff(curve[tick:], prepend=1.0)
+            out_ticks = np.arange(tick, curve.size)
+            before_target = out_ticks < target_tick
+            np.add.at(transitions[state], np.searchsorted(grid_ticks, out_ticks[before_target]),
+                      out_chances[before_target])
+            hits[state] = 1 - transitions[state].sum()
+
+        # dil budget left, as an index; the last index is the full budget, and without a budget there's only one
+        num_budgets = dil_budget + 1 if dil_budget is not None else 1
+        refill = np.zeros((num_states, num_budgets), dtype=bool)
+        hit_chances = np.zeros((num_states, num_budgets))
+        expected_dil = np.zeros((num_states, num_budgets))
+        for state in range(num_states - 1, -1, -1):
+            cost = costs[state]
+            if dil_budget is None:
+                after = np.zeros(1, dtype=np.intp)
+                affordable = np.ones(1, dtype=bool)
+            else:
+                after = np.maximum(np.arange(num_budgets) - cost, 0)
+                affordable = np.arange(num_budgets) >= cost
+            refill_hits = hits[state] + transitions[state] @ hit_chances[:, after]
+            refill_dil = cost + transitions[state] @ expected_dil[:, after]
+            # recalling has no chance of reaching the target and costs nothing, so refilling is better when it adds
+            # more value than it costs, or with no value on dil, when it has any chance at all
+            if dil_per_hit is None:
+                better = refill_hits > 0
+            else:
+                better = refill_hits * dil_per_hit > refill_dil
+            refill[state] = affordable & better & (refill_hits >= min_hit_chance)
+            if state == 0:
+                refill[state] = affordable
+            hit_chances[state] = np.where(refill[state], refill_hits, 0)
+            expected_dil[state] = np.where(refill[state], refill_dil, 0)
+
+        return RefillPlan(target_hours, dil_budget, grid_ticks, costs, refill, hit_chances, expected_dil)
+
+
+if __name__ == "__main__":
+    sample_stats = [13000, 12000, 6000, 5000, 4000, 3500, 2700]
+    planner = RefillPlanner(*sample_stats)
+    start = time.time()
+    plan = planner.plan(20)
+    print(f'{plan} in {time.time() - start:0.2f}s')
+    for decision in plan.decisions()[::12]:
+        print(decision)
+    start = time.time()
+    plan = planner.plan(20, dil_budget=500, min_hit_chance=0.5)
+    print(f'{plan} in {time.time() - start:0.2f}s')
+    for decision in plan.decisions()[::12]:
+        print(decision)
+    start = time.time()
+    plan = planner.plan(20, dil_budget=500, dil_per_hit=300)
+    print(f'{plan} in {time.time() - start:0.2f}s')
+    for decision in plan.decisions()[::12]:
+        print(decision)
@@ -0,0 +1,268 @@
+import bisect
+import itertools
+import math
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from GameData import SUBFOLDER_NAME
+from VoyageEstimator import TICKS_PER_HOUR, voyage_estimator_exact, voyage_estimator_numpy, voyage_estimator_batch
+
+SURROGATE_FILENAME = 'STT voyage surrogate.npz'
+SKILL_LEVELS = np.geomspace(1500, 30000, 12).round()
+OTHER_SKILL_LEVELS = np.geomspace(500, 16000, 6).round()
+AM_LEVELS = np.array([2000, 2500, 3000, 3500])
+
+# The 128 corners of a cell of the 7 dimensional grid, as 0/1 offsets from its lowest corner in each dimension
+CELL_CORNERS = np.array(list(itertools.product([0, 1], repeat=7)))
+
+
+def _estimate_ticks(skills, start_ams, estimator):
+    '''
+    Process pool entry point for VoyageSurrogate.build: estimates one lineup at each starting AM.
+
+    :return: (len(start_ams), 3) array of the average, safe, safer durations in ticks
+    '''
+    return np.array([estimator(*skills, int(start_am)) for start_am in start_ams]) * TICKS_PER_HOUR
+
+
+class VoyageSurrogate:
+    '''
+    Instant voyage estimates from a precomputed grid.  Estimates are made offline (see build) at every point of a grid
+    over primary skill, secondary skill, the other four skills in descending order, and starting AM, and saved to a
+    compact array file.  Lookups interpolate between the 128 grid points around the lineup.
+
+    Each lookup comes with an error bound: the largest second difference of the estimates along any axis of the grid
+    around the lineup, times 1/8 per axis, which is how far linear interpolation can be out when the estimates curve
+    no more than that.  When the bound is more than tolerance_minutes, or the lineup is off the grid, estimate falls
+    back to simulating the voyage.
+    '''
+
+    def __init__(self, *, tolerance_minutes=10, fallback=voyage_estimator_numpy,
+                 batch_fallback=voyage_estimator_batch, filepath=Path.home().joinpath(SUBFOLDER_NAME,
+                                                                                        SURROGATE_FILENAME),
+                 **precision):
+        '''
+
+        :param tolerance_minutes: largest error bound to accept before falling back to simulation
+        :param fallback: estimator function taking (ps, ss, o1, o2, o3, o4, startAm, **precision), used by estimate
+        :param batch_fallback: estimator function taking (skillMatrix, startAms, **precision), used by estimate_batch
+        :param filepath: array file written by build
+        :param precision: keyword arguments for the fallback estimators, e.g. numSims=5000
+        '''
+        self.tolerance_minutes = tolerance_minutes
+        self.fallback = fallback
+        self.batch_fallback = batch_fallback
+        self.filepath = filepath
+        self.precision = precision
+        self.hits = 0
+        self.fallbacks = 0
+        self.__levels = None
+
+    def __str__(self):
+        return f'{self.hits + self.fallbacks} estimates: {self.hits} from the surrogate, {self.fallbacks} simulated'
+
+    def __load(self):
+        if self.__levels is not None:
+            return
+        self.__levels = []
+        if not Path(self.filepath).exists():
+            print(f'No voyage surrogate at {self.filepath}; all estimates will be simulated')
+            return
+
+        print('Reading voyage surrogate from file...')
+        with np.load(self.filepath) as f:
+            grid = {name: f[name] for name in f.files}
+        self.__levels = [grid['skill_levels']] * 2 + [grid['other_skill_levels']] * 4 + [grid['am_levels']]
+        self.__level_lists = [levels.tolist() for levels in self.__levels]
+
+        # Expand the other skills to every order, so a cell's corners are a fixed set of offsets into the flattened grid
+        ticks = grid['ticks'][:, :, grid['combo_index']]
+        errors = grid['errors'][:, :, grid['combo_index']].max(axis=-1)
+        shape = ticks.shape[:-1]
+        self.__ticks = ticks.reshape(-1, 3).astype(np.float64) / TICKS_PER_HOUR
+        self.__strides = np.cumprod((shape[1:] + (1,))[::-1])[::-1]
+        self.__stride_list = self.__strides.tolist()
+        self.__corner_offsets = CELL_CORNERS @ self.__strides
+
+        # Error bound of each cell, indexed by its lowest corner: the largest error of its corners, plus half a tick for
+        # rounding the grid estimates to whole ticks
+        cell_errors = errors
+        for axis in range(errors.ndim):
+            cell_errors = np.maximum(cell_errors, np.roll(cell_errors, -1, axis=axis))
+        self.__cell_bounds = ((cell_errors + 0.5) / TICKS_PER_HOUR).ravel()
+
+    @staticmethod
+    def build(filepath=Path.home().joinpath(SUBFOLDER_NAME, SURROGATE_FILENAME), *, skill_levels=SKILL_LEVELS,
+              other_skill_levels=OTHER_SKILL_LEVELS, am_levels=AM_LEVELS, estimator=voyage_estimator_exact,
+              num_workers=None):
+        '''
+        Estimate every point of the grid and write the surrogate file.  Since the estimates don't depend on the order of
+        the other four skills, only grid points with the other skills in descending order are estimated.
+
+        :param filepath: array file to write
+        :param skill_levels: ascending grid levels for the primary and secondary skills
+        :param other_skill_levels: ascending grid levels for the other four skills
+        :param am_levels: ascending grid levels for starting AM
+        :param estimator: estimator function taking (ps, ss, o1, o2, o3, o4, startAm) and returning average, safe,
+                          safer durations in hours; a deterministic one such as voyage_estimator_exact keeps Monte
+                          Carlo noise out of the error bounds
+        :param num_workers: number of worker processes; None for one per CPU
+        '''
+        # the error bounds come from second differences, which need three levels on every axis; check before the grid
+        # estimates rather than after them
+        for name, levels in [('skill_levels', skill_levels), ('other_skill_levels', other_skill_levels),
+                             ('am_levels', am_levels)]:
+            if len(levels) < 3:
+                raise ValueError(f'{name} needs at least 3 levels to bound the interpolation error, got {len(levels)}')
+
+        num_others = len(other_skill_levels)
+        combos = np.array(list(itertools.combinations_with_replacement(range(num_others - 1, -1, -1), 4)))
+        combo_index = np.empty([num_others] * 4, dtype=np.int32)
+        for others in itertools.product(range(num_others), repeat=4):
+            combo_index[others] = np.flatnonzero((combos == sorted(others, reverse=True)).all(axis=1))[0]
+
+        lineups = [tuple(int(skill) for skill in [skill_levels[ps], skill_levels[ss], *other_skill_levels[combo]])
+                   for ps, ss, combo in itertools.product(range(len(skill_levels)), range(len(skill_levels)), combos)]
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            estimates = list(executor.map(_estimate_ticks, lineups, itertools.repeat(am_levels),
+                                          itertools.repeat(estimator), chunksize=64))
+        ticks = np.array(estimates).round().reshape(len(skill_levels), len(skill_levels), len(combos),
+                                                    len(am_levels), 3)
+        print(f'Estimated {ticks.size // 3} grid points in {time.time() - start:0.1f}s')
+
+        # Second differences along each axis of the full grid, with the other skills looked up through combo_index.
+        # Points on the edge of the grid take their neighbour's.
+        dense = ticks[:, :, combo_index].astype(np.float64)
+        curvature = np.zeros(dense.shape)
+        for axis in range(dense.ndim - 1):
+            second_diffs = np.abs(np.diff(dense, n=2, axis=axis))
+            curvature += np.concatenate([second_diffs.take([0], axis=axis), second_diffs,
+                                         second_diffs.take([-1], axis=axis)], axis=axis) / 8
+        combo_points = tuple(combos.T)
+        errors = curvature[:, :, combo_points[0], combo_points[1], combo_points[2], combo_points[3]]
+
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(filepath, skill_levels=skill_levels, other_skill_levels=other_skill_levels,
+                            am_levels=am_levels, combo_index=combo_index, ticks=ticks.astype(np.uint16),
+                            errors=np.ceil(errors).astype(np.uint16))
+
+    def lookup_batch(self, skill_matrix, start_ams):
+        '''
+        Interpolate estimates for many lineups.
+
+        :param skill_matrix: (N, 6) array-like of primary, secondary, other 1-4 skill totals
+        :param start_ams: starting AM of each lineup, or a single starting AM for all of them
+        :return: tuple of an (N, 3) array of average, safe, safer durations in hours, and an array of the error bound
+                 of each lineup in hours; inf for lineups off the grid
+        '''
+        self.__load()
+        skill_matrix = np.asarray(skill_matrix, dtype=np.float64)
+        start_ams = np.broadcast_to(np.asarray(start_ams, dtype=np.float64), skill_matrix.shape[:1])
+        if len(self.__levels) == 0:
+            return np.full((start_ams.size, 3), np.nan), np.full(start_ams.size, np.inf)
+
+        points = np.column_stack([skill_matrix[:, :2], -np.sort(-skill_matrix[:, 2:], axis=1), start_ams])
+        lows = np.empty(points.shape, dtype=np.intp)
+        fractions = np.empty(points.shape)
+        on_grid = np.ones(start_ams.size, dtype=bool)
+        for dim, levels in enumerate(self.__levels):
+            on_grid &= (points[:, dim] >= levels[0]) & (points[:, dim] <= levels[-1])
+            lows[:, dim] = np.clip(np.searchsorted(levels, points[:, dim], side='right') - 1, 0, levels.size - 2)
+            fractions[:, dim] = np.clip((points[:, dim] - levels[lows[:, dim]]) /
+                                        (levels[lows[:, dim] + 1] - levels[lows[:, dim]]), 0, 1)
+
+        # (N, 128) weights of the corners of each lineup's cell
+        weights = np.where(CELL_CORNERS, fractions[:, np.newaxis, :], 1 - fractions[:, np.newaxis, :]).prod(axis=2)
+        cells = lows @ self.__strides
+        estimates = np.einsum('nc,ncp->np', weights, self.__ticks[cells[:, np.newaxis] + self.__corner_offsets])
+        bounds = self.__cell_bounds[cells]
+        bounds[~on_grid] = np.inf
+        return estimates, bounds
+
+    def lookup(self, ps, ss, o1, o2, o3, o4, start_am):
+        '''
+        Interpolate an estimate for one lineup.  This is lookup_batch for a single lineup, with the per-lineup work
+        done on Python lists rather than arrays to keep the overhead down.
+
+        :return: tuple of (estimate, bound): the interpolated average, safe, safer durations in hours, and the error
+                 bound in hours; inf if the lineup is off the grid
+        '''
+        self.__load()
+        if len(self.__levels) == 0:
+            return (math.nan,) * 3, math.inf
+
+        cell = 0
+        fractions = []
+        for point, levels, stride in zip([ps, ss] + sorted([o1, o2, o3, o4], reverse=True) + [start_am],
+                                         self.__level_lists, self.__stride_list):
+            if not levels[0] <= point <= levels[-1]:
+                return (math.nan,) * 3, math.inf
+            low = min(bisect.bisect_right(levels, point) - 1, len(levels) - 2)
+            fractions.append((point - levels[low]) / (levels[low + 1] - levels[low]))
+            cell += low * stride
+
+        fractions = np.array(fractions)
+        weights = np.where(CELL_CORNERS, fractions, 1 - fractions).prod(axis=1)
+        estimate = weights @ self.__ticks[cell + self.__corner_offsets]
+        return tuple(estimate.tolist()), self.__cell_bounds[cell].item()
+
+    def estimate(self, ps, ss, o1, o2, o3, o4, start_am):
+        '''
+        Look up a voyage estimate, simulating the voyage if the lookup's error bound is more than tolerance_minutes.
+
+        :return: tuple of average, safe, safer durations in hours
+        '''
+        estimate, bound = self.lookup(ps, ss, o1, o2, o3, o4, start_am)
+        if bound * 60 <= self.tolerance_minutes:
+            self.hits += 1
+            return estimate
+
+        self.fallbacks += 1
+        return tuple(self.fallback(ps, ss, o1, o2, o3, o4, start_am, **self.precision))
+
+    def estimate_batch(self, skill_matrix, start_ams):
+        '''
+        Look up voyage estimates for many lineups, running the batch fallback once for all the lineups whose error
+        bounds are more than tolerance_minutes.
+
+        :return: (N, 3) array of average, safe, safer durations in hours
+        '''
+        estimates, bounds = self.lookup_batch(skill_matrix, start_ams)
+        missing = np.flatnonzero(bounds * 60 > self.tolerance_minutes)
+        self.hits += bounds.size - missing.size
+        self.fallbacks += missing.size
+        if missing.size > 0:
+            start_ams = np.broadcast_to(np.asarray(start_ams), bounds.shape)
+            estimates[missing] = self.batch_fallback(np.asarray(skill_matrix)[missing], start_ams[missing],
+                                                     **self.precision)
+        return estimates
+
+
+_default_surrogate = None
+
+
+def get_default_surrogate():
+    '''
+
+    :return: the shared VoyageSurrogate, read from the Star Trek Timelines folder
+    '''
+    global _default_surrogate
+    if _default_surrogate is None:
+        _default_surrogate = VoyageSurrogate()
+    return _default_surrogate
+
+
+if __name__ == "__main__":
+    surrogate = get_default_surrogate()
+    if not Path(surrogate.filepath).exists():
+        VoyageSurrogate.build(surrogate.filepath)
+
+    sample_stats = [13000, 12000, 6000, 5000, 4000, 3500, 2700]
+    for _ in range(3):
+        start = time.time()
+        result, error = surrogate.lookup(*sample_stats)
+        print(f'{result} +/- {error * 60:0.1f} minutes in {(time.time() - start) * 1e6:0.0f}us')
+    print(surrogate.estimate(*sample_stats))
+    print(surrogate)